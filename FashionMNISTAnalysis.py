@@ -54,29 +54,23 @@ PyTorch also offers prefloaded datasets for prototyping an dbenchmarking (image,
 
 import torch
 from torch.utils.data import Dataset
-from torchvision import datasets
-from torchvision.transforms import ToTensor, Lambda
 import matplotlib.pyplot as plt
+from FashionMNISTData import BatchIterator, load_raw
+from FashionMNISTSweep import EarlyStopping
+from FashionMNISTContributions import contribution_epoch
+from FashionMNISTMetrics import ArrayBuffer, PolynomialFit, PlotWorker
+from FashionMNISTInstrument import Instrument, format_summary
+from FashionMNISTCheckpoint import CheckpointManager
 
-training_data = datasets.FashionMNIST(
-    root="data",
-    train=True,
-    download=True,
-    transform=ToTensor()
-)
+training_data = load_raw(root="data", train=True)
 
-test_data = datasets.FashionMNIST(
-    root="data",
-    train=False,
-    download=True,
-    transform=ToTensor()
-)
+test_data = load_raw(root="data", train=False)
 
 '''
 root is the path where the train/test data is stored.
 train specifies training or test dataset.
 download=True downloads the data from the Internet if it's not available at root.
-transform and target_transform specify the feature and label transformations.
+load_raw memory-maps the raw IDX files (downloading them through torchvision only if they are missing), so pages are read only when a sample or batch touches them.
 '''
 
 print(training_data[0])
@@ -113,12 +107,9 @@ plt.show()
 
 import torch
 from torch import nn
-from torch.utils.data import DataLoader
-from torchvision import datasets
-from torchvision.transforms import ToTensor, Lambda
 
-train_dataloader = DataLoader(training_data, batch_size=64, shuffle=True)
-test_dataloader = DataLoader(test_data, batch_size=64, shuffle=True)
+train_dataloader = BatchIterator(training_data, batch_size=64, shuffle=True)
+test_dataloader = BatchIterator(test_data, batch_size=64, shuffle=True)
 #batch_size, number of datapoints/batch; shuffle -> ranodmly sample data by indices
 
 """Convert dataloader to iterable and iterate through it."""
@@ -228,15 +219,20 @@ print(model.parameters())
 
 def train_loop(dataloader, model, loss_fn, optimizer):
     size = len(dataloader.dataset)
-    for batch, (X, y) in enumerate(dataloader):
+    for batch, (X, y) in enumerate(instrument.timed(dataloader)):
         # Compute prediction and loss
-        pred = model(X)
-        loss = loss_fn(pred, y)
+        with instrument.phase("forward"):
+            pred = model(X)
+        with instrument.phase("loss"):
+            loss = loss_fn(pred, y)
 
         # Backpropagation
-        optimizer.zero_grad()
-        loss.backward() #calculates and aggregates
-        optimizer.step()
+        with instrument.phase("backward"):
+            optimizer.zero_grad()
+            loss.backward() #calculates and aggregates
+        with instrument.phase("step"):
+            optimizer.step()
+        instrument.step(len(y))
 
         if batch % 100 == 0: #periodically print loss
             optimizer.step() #applies gradients
@@ -244,43 +240,12 @@ def train_loop(dataloader, model, loss_fn, optimizer):
             print(f"loss: {loss:>7f}  [{current:>5d}/{size:>5d}]") #resets gradients
 
 def test_loop(dataloader, model, loss_fn, optimizer):
-    size = len(dataloader.dataset)
-    test_loss, correct = 0, 0
-
-    state = optimizer.state_dict()["state"]
-
-    contributions = [np.zeros(shape=(state[i]["momentum_buffer"].shape[0])) for i in range(0,len(state)-2,2)]
-    for X, y in dataloader:
-        pred = model(X)
-        
-        loss = loss_fn(pred,y)
-        optimizer.zero_grad()
-        loss.backward()
-        
-        test_loss += loss.item() #accumulates loss
-        correct += (pred.argmax(1) == y).type(torch.float).sum().item()
-        
-        state = optimizer.state_dict()["state"]
-        for i,layer in enumerate(contributions):
-            #print("layer",layer.shape)
-            #print("buffer",weights:=torch.abs(state[i*2]["momentum_buffer"]).sum(1).squeeze().shape.numpy())
-            #print("biases",biases:=state[(i*2+1)]["momentum_buffer"].numpy())
-            weights=torch.abs(state[i*2]["momentum_buffer"]).sum(1).squeeze().numpy()
-            biases=torch.abs(state[(i*2+1)]["momentum_buffer"]).numpy()
-            #print(layer.shape,weights.shape,biases.shape)
-            #print(weights,biases)
-            contributions[i] = (contributions[i]+weights+biases)
-            #print(layer)
-
-    test_loss /= size #averages loss
-    correct /= size #finds accuracy percent
-    #state = optimizer.state_dict()["state"]
-    #print([layer for layer in contributions])
-    #contributions =[torch.abs(state[i]["momentum_buffer"]).sum(1).squeeze() for i in range(0,len(state)-2,2)]
-    #print([layer for layer in contributions])
-
-    # distribution = np.dot(weights,biases).squeeze()
-    # print(distribution)
+    #momentum buffers are read in place and summed on-device, as are loss and accuracy; the host only sees them once per epoch
+    #per-sample mode: vmap(grad) gives each example's contribution for the whole batch in one call
+    contributions, correct, test_loss, sample_summary = contribution_epoch(dataloader, model, loss_fn, optimizer,
+                                                                           per_sample_analysis, instrument)
+    if sample_summary is not None:
+        sample_summaries.append(sample_summary) #per-neuron mean and variance across samples for this epoch
     print(f"Test Error: \n Accuracy: {(100*correct):>0.1f}%, Avg loss: {test_loss:>8f} \n")
 
     return contributions, correct
@@ -295,38 +260,52 @@ loss_fn = nn.CrossEntropyLoss()
 optimizer = torch.optim.SGD(model.parameters(), lr=learning_rate,momentum = 0.5)
 
 
-variations = np.array([])
-accuracies = np.array([])
 epochs = 1000
-for t in range(epochs):
+variation_history = ArrayBuffer(epochs) #preallocated; no per-epoch np.append copies
+accuracy_history = ArrayBuffer(epochs)
+fit = PolynomialFit(degree=2) #incremental quadratic fit of variation against accuracy
+plotter = PlotWorker("data/plots", every=10, process=False) #charts are rendered to PNGs on a background thread (a spawned process would re-run this unguarded script)
+per_sample_analysis = False #variation of each neuron's contribution across samples (slower, more memory)
+sample_summaries = []
+stopper = EarlyStopping(patience=50) #stops once accuracy has plateaued for 50 epochs
+profile_phases = False #per-phase timings (data, forward, loss, backward, step, contributions, plotting) appended to data/phases.jsonl each epoch
+instrument = Instrument(enabled=profile_phases, log="data/phases.jsonl", profile_steps=(10, 20)) #steps 10-20 also go to a Chrome trace in data/trace.json
+checkpoints = CheckpointManager("data/checkpoints/analysis", every_epochs=10, every_seconds=600, keep=3) #snapshots are written on a background thread
+start_epoch, stopping = 0, False
+resumed = checkpoints.resume(model, optimizer) #picks up from the newest checkpoint if a previous run was interrupted
+if resumed is not None:
+    start_epoch = resumed["epoch"]
+    for accuracy, variation in zip(resumed["history"]["accuracies"], resumed["history"]["variations"]):
+        accuracy_history.append(accuracy)
+        variation_history.append(variation)
+        fit.update(accuracy, variation)
+    variations, accuracies = variation_history.values, accuracy_history.values
+    vars(stopper).update(resumed["extra"]["stopper"])
+    sample_summaries = resumed["extra"]["sample_summaries"]
+    contributions, stopping = resumed["extra"]["contributions"], resumed["extra"]["stopping"]
+    print(f"Resumed after epoch {start_epoch}")
+for t in range(start_epoch, start_epoch if stopping else epochs):
     print(f"Epoch {t+1}\n-------------------------------")
     train_loop(train_dataloader, model, loss_fn, optimizer)
     contributions, accuracy = test_loop(test_dataloader, model, loss_fn,optimizer)
-    variations = np.append(variations,np.std(contributions))
-    accuracies = np.append(accuracies,accuracy)
-    
-    plt.scatter(accuracies,variations)
-    p = np.polyfit(accuracies,variations,2)
-    plt.plot(accuracies,p[0]*accuracies**2+p[1]*accuracies**1+p[2])
-    plt.show()
-    print((package := np.concatenate(contributions)).shape)
-    plt.hist(package, color='lightgreen', ec='black')
-    plt.show()
-    
-
-    circle_radius = 3
-    x=0; y=0
-    plt.axis([0,circle_radius * 3 * len(contributions),0,circle_radius*3*max([len(layer) for layer in contributions])])
-    #plt.axis("equal")
-    for layer in contributions:
-        y = 0
-        x += 2*circle_radius
-        biggest = max(layer)
-        for neuron in layer:
-            y += 3*circle_radius
-            strength = (neuron/biggest).item()
-            plt.gca().add_artist(plt.Circle((x,y),radius=circle_radius,color=(strength,0,1-strength)))
-    plt.show()
+    with instrument.phase("plotting"):
+        variation = np.std(contributions)
+        variation_history.append(variation)
+        accuracy_history.append(accuracy)
+        fit.update(accuracy, variation)
+        variations, accuracies = variation_history.values, accuracy_history.values
+        
+        stopping = stopper.step(accuracy)
+        plotter.submit(t+1, accuracies, variations, fit.coefficients(), contributions, force=stopping or t == epochs-1)
+    checkpoints.save(t+1, model, optimizer, history={"accuracies": accuracies, "variations": variations},
+                     extra={"stopper": vars(stopper), "sample_summaries": sample_summaries, "contributions": contributions, "stopping": stopping},
+                     force=stopping or t == epochs-1)
+    if profile_phases:
+        print(format_summary(instrument.end_epoch(t+1, accuracy=accuracy)))
+
+    if stopping:
+        print(f"Accuracy plateaued at {(100*stopper.best):>0.1f}% (epoch {stopper.best_epoch}), stopping early")
+        break
             
         
     
@@ -335,8 +314,19 @@ for t in range(epochs):
     #   print(optimizer.state_dict()["state"].values()[i]["momentum_buffer"])
 
 
+plotter.close()
+instrument.close()
+checkpoints.close()
 print("Done!")
 
+if per_sample_analysis:
+    #average per-sample standard deviation of neuron contribution, against accuracy
+    neuron_variations = [np.mean(np.concatenate([np.sqrt(var) for var in summary["var"]])) for summary in sample_summaries]
+    plt.scatter(accuracies, neuron_variations)
+    plt.xlabel("Accuracy")
+    plt.ylabel("Mean per-sample std of neuron contribution")
+    plt.show()
+
 
 
 torch.save(model.state_dict(),"data/model.pth") #stores learned parameters in specified path
@@ -349,6 +339,19 @@ print("Saved PyTorch Model state to model.pth")
 model = NeuralNetwork()
 model.load_state_dict(torch.load('data/model.pth'))
 
+"""Structured pruning: the lowest-contribution neurons of each hidden layer are removed and the Linear layers rebuilt smaller, then briefly fine-tuned, to trade accuracy against measured FLOPs and latency"""
+
+from FashionMNISTPrune import prune_sweep
+
+prune_ratios = [0.0, 0.25, 0.5, 0.75, 0.9]
+prune_results = prune_sweep(model, contributions, prune_ratios, test_dataloader, loss_fn, train_dataloader, fine_tune_epochs=1)
+plt.plot([row["flops"] / 1e6 for row in prune_results], [row["accuracy"] for row in prune_results], marker="o", label="pruned")
+plt.plot([row["flops"] / 1e6 for row in prune_results], [row["tuned_accuracy"] for row in prune_results], marker="o", label="fine-tuned")
+plt.xlabel("MFLOPs per sample")
+plt.ylabel("Accuracy (%)")
+plt.legend()
+plt.show()
+
 """Things to do:
 - Identify plateau in neural network
 - Graph variation of contributions with respect to accuracy and regress(are neural networks with a more diverse set of weight gradients more accurate? How strong is this relationship)
@@ -0,0 +1,113 @@
+import argparse
+import time
+
+import torch
+
+from FashionMNISTData import BatchIterator, load_raw
+
+
+class BatchAugment:
+    # Random shift, horizontal flip, random erasing and Gaussian noise applied to a whole [N, C, H, W] batch
+    # with a handful of tensor ops, instead of per image in DataLoader workers. Randomness comes from one
+    # seeded generator per device, so a run is reproducible. Images are assumed to be in [0, 1].
+    def __init__(self, shift=2, flip=0.5, erase=0.0, erase_scale=(0.02, 0.2), erase_ratio=(0.3, 3.3), noise=0.0, seed=0):
+        self.shift = shift
+        self.flip = flip
+        self.erase = erase
+        self.erase_scale = erase_scale
+        self.erase_ratio = erase_ratio
+        self.noise = noise
+        self.seed = seed
+        self.generators = {}
+
+    def _generator(self, device):
+        if device not in self.generators:
+            self.generators[device] = torch.Generator(device).manual_seed(self.seed)
+        return self.generators[device]
+
+    def _uniform(self, n, low, high, generator, device):
+        return torch.rand(n, generator=generator, device=device) * (high - low) + low
+
+    def __call__(self, X):
+        n, c, h, w = X.shape
+        device = X.device
+        generator = self._generator(device)
+        rows, cols = torch.arange(h, device=device), torch.arange(w, device=device)
+
+        if self.shift:
+            # Batched RandomCrop(28, padding=shift): unfold the zero-padded batch into a (no-copy) view of every
+            # HxW window, then copy out one window per sample
+            padded = torch.nn.functional.pad(X, (self.shift,) * 4)
+            windows = padded.unfold(2, h, 1).unfold(3, w, 1)
+            dy = torch.randint(0, 2 * self.shift + 1, (n,), generator=generator, device=device)
+            dx = torch.randint(0, 2 * self.shift + 1, (n,), generator=generator, device=device)
+            X = windows[torch.arange(n, device=device), :, dy, dx]
+
+        if self.flip:
+            flipped = torch.rand(n, generator=generator, device=device) < self.flip
+            X = torch.where(flipped[:, None, None, None], X.flip(-1), X)
+
+        if self.erase:
+            # One rectangle per selected sample, area and aspect ratio drawn as in torchvision's RandomErasing
+            erased = torch.rand(n, generator=generator, device=device) < self.erase
+            area = self._uniform(n, *self.erase_scale, generator, device) * h * w
+            ratio = torch.exp(self._uniform(n, *torch.log(torch.tensor(self.erase_ratio)).tolist(), generator, device))
+            eh = torch.sqrt(area * ratio).round().clamp(1, h).long()
+            ew = torch.sqrt(area / ratio).round().clamp(1, w).long()
+            top = (torch.rand(n, generator=generator, device=device) * (h - eh + 1)).long()
+            left = (torch.rand(n, generator=generator, device=device) * (w - ew + 1)).long()
+            inside = ((rows[None, :] >= top[:, None]) & (rows[None, :] < (top + eh)[:, None]))[:, :, None] & \
+                     ((cols[None, :] >= left[:, None]) & (cols[None, :] < (left + ew)[:, None]))[:, None, :]
+            X = X.masked_fill((inside & erased[:, None, None])[:, None], 0.0)
+
+        if self.noise:
+            X = (X + self.noise * torch.randn(X.shape, generator=generator, device=device, dtype=X.dtype)).clamp_(0, 1)
+        return X
+
+
+def compare_throughput(root="data", batch_size=256, batches=50, workers=0, seed=0):
+    # Samples/sec of shift + flip + erase done on whole batches vs the per-sample torchvision pipeline
+    rates = {}
+    augment = BatchAugment(shift=2, flip=0.5, erase=0.5, seed=seed)
+    loader = BatchIterator(load_raw(root=root, train=True), batch_size, shuffle=True, generator=torch.Generator().manual_seed(seed))
+    count = 0
+    start = time.perf_counter()
+    for i, (X, y) in enumerate(loader):
+        augment(X)
+        count += len(y)
+        if i + 1 == batches:
+            break
+    rates["batched"] = count / (time.perf_counter() - start)
+
+    try:
+        from torchvision import datasets, transforms
+    except ImportError:
+        print("torchvision is not installed; skipping the per-sample comparison")
+    else:
+        transform = transforms.Compose([transforms.RandomCrop(28, padding=2), transforms.RandomHorizontalFlip(),
+                                        transforms.ToTensor(), transforms.RandomErasing(p=0.5)])
+        dataset = datasets.FashionMNIST(root=root, train=True, download=True, transform=transform)
+        loader = torch.utils.data.DataLoader(dataset, batch_size=batch_size, shuffle=True, num_workers=workers)
+        count = 0
+        start = time.perf_counter()
+        for i, (X, y) in enumerate(loader):
+            count += len(y)
+            if i + 1 == batches:
+                break
+        rates["torchvision"] = count / (time.perf_counter() - start)
+
+    for name, rate in rates.items():
+        print(f"{name:>12}: {rate:>12,.0f} samples/s")
+    if len(rates) == 2:
+        print(f"{'speedup':>12}: {rates['batched'] / rates['torchvision']:>11.1f}x")
+    return rates
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Batched augmentation vs per-sample torchvision transforms")
+    parser.add_argument("--root", default="data")
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--batches", type=int, default=50)
+    parser.add_argument("--workers", type=int, default=0, help="DataLoader workers for the torchvision pipeline")
+    args = parser.parse_args()
+    compare_throughput(args.root, args.batch_size, args.batches, args.workers)
@@ -0,0 +1,197 @@
+import argparse
+import json
+import math
+import os
+import statistics
+import sys
+import time
+
+import torch
+from torch import nn
+
+from FashionMNISTData import BatchIterator, ShardedIDXStream, TensorDataset, load_raw, raw_paths
+from FashionMNISTModel import NeuralNetwork, train, test
+from FashionMNISTTuner import host_fingerprint
+
+BATCH_SIZES = (1, 4, 16, 64, 256, 1024, 4096)
+# Two-sided 95% Student t critical values by degrees of freedom. Untabulated df use the nearest smaller entry,
+# whose value is larger, so intervals err wide (df > 30 uses 2.04 rather than the limit 1.96)
+T95 = {1: 12.71, 2: 4.30, 3: 3.18, 4: 2.78, 5: 2.57, 6: 2.45, 7: 2.36, 8: 2.31, 9: 2.26, 10: 2.23,
+       12: 2.18, 15: 2.13, 20: 2.09, 30: 2.04}
+
+
+def confidence_interval(values):
+    mean = statistics.fmean(values)
+    if len(values) < 2:
+        return mean, mean, mean
+    df = len(values) - 1
+    t = T95[max(k for k in T95 if k <= df)]
+    half = t * statistics.stdev(values) / math.sqrt(len(values))
+    return mean, mean - half, mean + half
+
+
+def measure(fn, samples, warmup=1, trials=5):
+    # fn() processes `samples` samples; returns samples/sec over `trials` timed runs after `warmup` untimed ones
+    for _ in range(warmup):
+        fn()
+    rates = []
+    for _ in range(trials):
+        start = time.perf_counter()
+        fn()
+        rates.append(samples / (time.perf_counter() - start))
+    mean, low, high = confidence_interval(rates)
+    return {"samples_per_s": mean, "ci95": [low, high], "trials": rates, "samples": samples}
+
+
+def _subset(dataset, count):
+    return TensorDataset(dataset.data[:count], dataset.targets[:count])
+
+
+def bench_train(training_data, batch_size, steps, warmup, trials):
+    count = min(len(training_data), batch_size * steps)
+    dataloader = BatchIterator(_subset(training_data, count), batch_size)
+    torch.manual_seed(0)
+    model = NeuralNetwork()
+    loss_fn = nn.CrossEntropyLoss()
+    optimizer = torch.optim.SGD(model.parameters(), lr=1e-3)
+    return measure(lambda: train(dataloader, model, loss_fn, optimizer, verbose=False), count, warmup, trials)
+
+
+def bench_test(test_data, batch_size, steps, warmup, trials):
+    count = min(len(test_data), batch_size * steps)
+    dataloader = BatchIterator(_subset(test_data, count), batch_size)
+    torch.manual_seed(0)
+    model = NeuralNetwork()
+    loss_fn = nn.CrossEntropyLoss()
+    return measure(lambda: test(dataloader, model, loss_fn, verbose=False), count, warmup, trials)
+
+
+def bench_inference(batch_size, steps, warmup, trials):
+    # Bare forward passes on a resident batch: no loader, no loss, no host sync beyond the timer
+    torch.manual_seed(0)
+    model = NeuralNetwork().eval()
+    X = torch.rand(batch_size, 1, 28, 28)
+
+    def run():
+        with torch.no_grad():
+            for _ in range(steps):
+                model(X)
+    return measure(run, batch_size * steps, warmup, trials)
+
+
+def _drain(loader, batches):
+    count = 0
+    for i, (X, y) in enumerate(loader):
+        count += len(y)
+        if i + 1 == batches:
+            break
+    return count
+
+
+def loader_factories(root, batch_size):
+    # Every loader path that can produce training batches on this install; torchvision is optional
+    factories = {
+        "batch_iterator": lambda: BatchIterator(load_raw(root=root, train=True), batch_size, shuffle=True),
+        "sharded_idx_stream": lambda: ShardedIDXStream([raw_paths(root, train=True)], batch_size, shuffle=True),
+    }
+    try:
+        from torchvision import datasets
+        from torchvision.transforms import ToTensor
+        dataset = datasets.FashionMNIST(root=root, train=True, download=True, transform=ToTensor())
+        factories["torchvision"] = lambda: torch.utils.data.DataLoader(dataset, batch_size=batch_size, shuffle=True)
+    except ImportError:
+        pass
+    return factories
+
+
+def bench_loader(factory, batch_size, steps, warmup, trials):
+    loader = factory()
+    count = _drain(loader, steps) # also sizes the run: the dataset may hold fewer than steps batches
+    return measure(lambda: _drain(loader, steps), count, warmup, trials)
+
+
+def run_suite(batch_sizes=BATCH_SIZES, benchmarks=("train", "test", "inference", "loader"), steps=20,
+              warmup=1, trials=5, root="data", verbose=True):
+    torch.manual_seed(0)
+    training_data = load_raw(root=root, train=True)
+    test_data = load_raw(root=root, train=False)
+    results = {}
+    for batch_size in batch_sizes:
+        cases = {}
+        if "train" in benchmarks:
+            cases["train"] = lambda: bench_train(training_data, batch_size, steps, warmup, trials)
+        if "test" in benchmarks:
+            cases["test"] = lambda: bench_test(test_data, batch_size, steps, warmup, trials)
+        if "inference" in benchmarks:
+            cases["inference"] = lambda: bench_inference(batch_size, steps, warmup, trials)
+        if "loader" in benchmarks:
+            for name, factory in loader_factories(root, batch_size).items():
+                cases[f"loader/{name}"] = lambda factory=factory: bench_loader(factory, batch_size, steps, warmup, trials)
+        for name, case in cases.items():
+            key = f"{name}/{batch_size}"
+            results[key] = case()
+            if verbose:
+                low, high = results[key]["ci95"]
+                print(f"{key:<32}{results[key]['samples_per_s']:>14,.0f} samples/s  [{low:,.0f}, {high:,.0f}]")
+    meta = {"host": host_fingerprint(), "torch": torch.__version__, "threads": torch.get_num_threads(),
+            "steps": steps, "warmup": warmup, "trials": trials, "time": time.time()}
+    return {"meta": meta, "results": results}
+
+
+def compare(report, baseline, tolerance=0.05):
+    # A benchmark regresses when its mean drops more than `tolerance` below the baseline mean and the two
+    # 95% intervals don't overlap, so ordinary run-to-run noise isn't flagged
+    rows = []
+    for key, current in report["results"].items():
+        if key not in baseline["results"]:
+            continue
+        base = baseline["results"][key]
+        change = current["samples_per_s"] / base["samples_per_s"] - 1
+        regressed = change < -tolerance and current["ci95"][1] < base["ci95"][0]
+        rows.append({"benchmark": key, "baseline": base["samples_per_s"], "current": current["samples_per_s"],
+                     "change": change, "regressed": regressed})
+    return rows
+
+
+def print_comparison(rows, baseline):
+    print(f"{'benchmark':<32}{'baseline':>14}{'current':>14}{'change':>9}")
+    for row in rows:
+        flag = "  REGRESSION" if row["regressed"] else ""
+        print(f"{row['benchmark']:<32}{row['baseline']:>14,.0f}{row['current']:>14,.0f}{100 * row['change']:>+8.1f}%{flag}")
+    if baseline["meta"]["host"] != host_fingerprint():
+        print("warning: baseline was recorded on a different host")
+
+
+def _write(path, report):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path + ".tmp", "w") as f:
+        json.dump(report, f, indent=1)
+    os.replace(path + ".tmp", path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Samples/sec for train, test, inference and the data loaders")
+    parser.add_argument("--root", default="data")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=list(BATCH_SIZES))
+    parser.add_argument("--only", nargs="+", choices=["train", "test", "inference", "loader"],
+                        default=["train", "test", "inference", "loader"])
+    parser.add_argument("--steps", type=int, default=20, help="batches per trial")
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--trials", type=int, default=5)
+    parser.add_argument("--output", default="data/benchmark.json")
+    parser.add_argument("--baseline", default="data/benchmark_baseline.json")
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.05)
+    args = parser.parse_args()
+
+    report = run_suite(args.batch_sizes, args.only, args.steps, args.warmup, args.trials, args.root)
+    _write(args.output, report)
+    if args.save_baseline:
+        _write(args.baseline, report)
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        rows = compare(report, baseline, args.tolerance)
+        print_comparison(rows, baseline)
+        if any(row["regressed"] for row in rows):
+            sys.exit(1)
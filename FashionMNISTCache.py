@@ -0,0 +1,210 @@
+import argparse
+import collections
+import hashlib
+import os
+import sqlite3
+import time
+
+import numpy as np
+import torch
+
+from FashionMNISTModel import model_device
+from FashionMNISTServe import to_input
+
+
+def pixel_digest(image):
+    # 16-byte blake2b of the 28x28 uint8 pixels, read the way to_input() reads them: integers of any dtype
+    # are 0-255 pixel values, floats are in [0, 1] and quantized back to uint8, so the same garment hashes
+    # the same whichever form the client sent
+    array = np.asarray(image)
+    if np.issubdtype(array.dtype, np.integer) or array.dtype == np.bool_:
+        array = np.clip(array, 0, 255).astype(np.uint8)
+    else:
+        array = np.rint(np.clip(array.astype(np.float32) * 255, 0, 255)).astype(np.uint8)
+    return hashlib.blake2b(np.ascontiguousarray(array.reshape(28 * 28)).tobytes(), digest_size=16).digest()
+
+
+def file_version(path):
+    with open(path, "rb") as f:
+        return hashlib.blake2b(f.read(), digest_size=8).hexdigest()
+
+
+class PredictionCache:
+    # Softmax outputs keyed by pixel digest + checkpoint version, in a bounded in-memory LRU with an optional
+    # time-to-live. persist= names a SQLite file that worker processes share, so one worker's result is a hit
+    # for the others and survives restarts. Callers check the checkpoint at model_path with refresh() (a stat, at
+    # most every check_interval seconds) before looking up; when its contents change the version moves on,
+    # old entries are dropped and refresh() returns True so the caller can reload the model.
+    def __init__(self, max_entries=100_000, ttl=None, model_path="data/model.pth", persist=None, check_interval=1.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.model_path = model_path
+        self.check_interval = check_interval
+        self.entries = collections.OrderedDict()
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+        self.stat, self.version, self.checked = None, None, 0.0
+        self.connection = None
+        if persist is not None:
+            os.makedirs(os.path.dirname(persist) or ".", exist_ok=True)
+            self.connection = sqlite3.connect(persist, timeout=60, check_same_thread=False)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS predictions "
+                                    "(digest BLOB PRIMARY KEY, version TEXT, probabilities BLOB, created REAL)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS predictions_created ON predictions (created)")
+            self.connection.commit()
+        self.refresh(force=True)
+
+    digest = staticmethod(pixel_digest)
+
+    def refresh(self, force=False):
+        # Returns True when the checkpoint changed since the last check (callers should reload the model)
+        now = time.monotonic()
+        if not force and now - self.checked < self.check_interval:
+            return False
+        self.checked = now
+        if self.model_path is None or not os.path.exists(self.model_path):
+            return False
+        stat = os.stat(self.model_path)
+        stat = (stat.st_mtime_ns, stat.st_size)
+        if stat == self.stat:
+            return False
+        self.stat = stat
+        version = file_version(self.model_path)
+        if version == self.version:
+            return False
+        changed = self.version is not None
+        self.version = version
+        if changed:
+            self.invalidations += 1
+        self.entries.clear()
+        if self.connection is not None:
+            with self.connection:
+                self.connection.execute("DELETE FROM predictions WHERE version != ?", (version,))
+        return changed
+
+    def _expired(self, created):
+        return self.ttl is not None and time.time() - created > self.ttl
+
+    def get_many(self, digests):
+        # {digest: probabilities} for every hit under the current version; counts each requested digest as a
+        # hit or a miss. Call refresh() first so a changed checkpoint is noticed together with its model reload
+        found, missing = {}, []
+        for digest in digests:
+            entry = self.entries.get(digest)
+            if entry is not None and self._expired(entry[0]):
+                del self.entries[digest]
+                entry = None
+            if entry is not None:
+                self.entries.move_to_end(digest)
+                found[digest] = entry[1]
+            else:
+                missing.append(digest)
+        if missing and self.connection is not None:
+            placeholders = ",".join("?" * len(missing))
+            rows = self.connection.execute(f"SELECT digest, probabilities, created FROM predictions "
+                                           f"WHERE version = ? AND digest IN ({placeholders})", (self.version, *missing))
+            for digest, blob, created in rows:
+                if not self._expired(created):
+                    probabilities = np.frombuffer(blob, dtype=np.float32)
+                    found[digest] = probabilities
+                    self._remember(digest, probabilities, created)
+        self.hits += len(found)
+        self.misses += len(digests) - len(found)
+        return found
+
+    def get(self, digest):
+        return self.get_many([digest]).get(digest)
+
+    def _remember(self, digest, probabilities, created):
+        self.entries[digest] = (created, probabilities)
+        self.entries.move_to_end(digest)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def put_many(self, items):
+        created = time.time()
+        rows = []
+        for digest, probabilities in items:
+            probabilities = np.asarray(probabilities, dtype=np.float32)
+            self._remember(digest, probabilities, created)
+            rows.append((digest, self.version, probabilities.tobytes(), created))
+        if self.connection is not None and rows:
+            with self.connection:
+                self.connection.executemany("INSERT OR REPLACE INTO predictions VALUES (?, ?, ?, ?)", rows)
+                if self.ttl is not None:
+                    self.connection.execute("DELETE FROM predictions WHERE created < ?", (created - self.ttl,))
+                # The shared file is bounded too, oldest entries first. Exactly the overflow is deleted: a batch
+                # shares one timestamp, so rows are ordered by (created, rowid), which the created index already
+                # holds (SQLite appends the rowid to every index), and a put never sorts the table
+                excess = self.connection.execute("SELECT COUNT(*) FROM predictions").fetchone()[0] - self.max_entries
+                if excess > 0:
+                    self.connection.execute("DELETE FROM predictions WHERE rowid IN (SELECT rowid FROM predictions "
+                                            "ORDER BY created, rowid LIMIT ?)", (excess,))
+
+    def put(self, digest, probabilities):
+        self.put_many([(digest, probabilities)])
+
+    def clear(self):
+        # Empties the memory and the shared file and resets the counters, e.g. between load-test runs
+        self.entries.clear()
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+        if self.connection is not None:
+            with self.connection:
+                self.connection.execute("DELETE FROM predictions")
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self.entries), "evictions": self.evictions, "invalidations": self.invalidations,
+                "version": self.version}
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+
+
+def predict_cached(model, images, cache):
+    # Softmax probabilities [N, 10] for a batch of images; only distinct cache misses go through the model.
+    # When the cache sees a new checkpoint, the model's weights are reloaded from it in place first, so
+    # predictions stored under the new version come from the new weights.
+    if cache.refresh():
+        model.load_state_dict(torch.load(cache.model_path, map_location=model_device(model)))
+    digests = [pixel_digest(image) for image in images]
+    found = cache.get_many(digests)
+    missing = list(dict.fromkeys(digest for digest in digests if digest not in found))
+    if missing:
+        first = {digest: i for i, digest in reversed(list(enumerate(digests)))}
+        batch = torch.stack([to_input(images[first[digest]]) for digest in missing]).to(model_device(model))
+        with torch.no_grad():
+            probabilities = torch.softmax(model(batch), dim=1).cpu().numpy()
+        computed = dict(zip(missing, probabilities))
+        cache.put_many(computed.items())
+        found.update(computed)
+    return np.stack([found[digest] for digest in digests])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Throughput of cached vs uncached batch prediction on a stream with repeats")
+    parser.add_argument("--model", default="data/model.pth")
+    parser.add_argument("--persist", help="shared SQLite cache file")
+    parser.add_argument("--distinct", type=int, default=1000, help="distinct test images in the stream")
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--batch-size", type=int, default=64)
+    args = parser.parse_args()
+
+    from FashionMNISTData import load_raw
+    from FashionMNISTServe import load_model
+    model = load_model(args.model)
+    images = load_raw(root="data", train=False).data[:args.distinct].numpy()
+    stream = images[np.random.default_rng(0).integers(0, len(images), args.requests)]
+    cache = PredictionCache(model_path=args.model, persist=args.persist)
+    for name, run in (("uncached", lambda batch: torch.softmax(model(torch.from_numpy(batch).float().div_(255).unsqueeze(1)), dim=1)),
+                      ("cached", lambda batch: predict_cached(model, batch, cache))):
+        start = time.perf_counter()
+        with torch.no_grad():
+            for i in range(0, len(stream), args.batch_size):
+                run(stream[i:i + args.batch_size])
+        print(f"{name:>9}: {len(stream) / (time.perf_counter() - start):>10,.0f} images/s")
+    print(cache.stats())
+    cache.close()
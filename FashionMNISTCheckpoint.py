@@ -0,0 +1,142 @@
+import glob
+import os
+import random
+import threading
+import time
+
+import numpy as np
+import torch
+
+
+def _to_cpu(obj):
+    # Deep copy with every tensor cloned to host memory, so training can keep mutating the originals
+    if isinstance(obj, torch.Tensor):
+        return obj.detach().to("cpu", copy=True)
+    if isinstance(obj, dict):
+        return {key: _to_cpu(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(_to_cpu(value) for value in obj)
+    if isinstance(obj, np.ndarray):
+        return obj.copy()
+    return obj
+
+
+def rng_state():
+    state = {"torch": torch.get_rng_state(), "numpy": np.random.get_state(), "python": random.getstate()}
+    if torch.cuda.is_available():
+        state["cuda"] = torch.cuda.get_rng_state_all()
+    return state
+
+
+def set_rng_state(state):
+    torch.set_rng_state(state["torch"])
+    np.random.set_state(state["numpy"])
+    random.setstate(state["python"])
+    if "cuda" in state and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state["cuda"])
+
+
+class CheckpointManager:
+    # Periodic, resumable training snapshots: model, optimizer (SGD momentum buffers included), epoch, RNG
+    # state and whatever metric history the caller passes. save() only takes a CPU copy; a background thread
+    # does the torch.save, writing to a temporary file and renaming it into place, so a crash mid-write never
+    # leaves a truncated checkpoint. If the disk falls behind, an unwritten snapshot is replaced by the newer one.
+    def __init__(self, directory="data/checkpoints", every_epochs=10, every_seconds=None, keep=3, prefix="checkpoint"):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.every_epochs = every_epochs
+        self.every_seconds = every_seconds
+        self.keep = keep
+        self.prefix = prefix
+        self.last_save = time.monotonic()
+        self.pending = None
+        self.writing = False
+        self.error = None
+        self.closed = False
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self._writer, daemon=True)
+        self.thread.start()
+
+    def paths(self):
+        # Oldest first; zero-padded epoch numbers sort correctly as strings
+        return sorted(glob.glob(os.path.join(self.directory, f"{self.prefix}_*.pt")))
+
+    def due(self, epoch):
+        if self.every_epochs and epoch % self.every_epochs == 0:
+            return True
+        return self.every_seconds is not None and time.monotonic() - self.last_save >= self.every_seconds
+
+    def save(self, epoch, model, optimizer, history=None, extra=None, force=False):
+        # Returns immediately after the CPU copy; pass force=True for the final epoch
+        if self.error is not None:
+            raise RuntimeError("checkpoint writer failed") from self.error
+        if not force and not self.due(epoch):
+            return False
+        snapshot = {"epoch": epoch, "model": _to_cpu(model.state_dict()), "optimizer": _to_cpu(optimizer.state_dict()),
+                    "rng": rng_state(), "history": _to_cpu(history), "extra": _to_cpu(extra), "time": time.time()}
+        with self.condition:
+            self.pending = snapshot
+            self.condition.notify_all()
+        self.last_save = time.monotonic()
+        return True
+
+    def _writer(self):
+        while True:
+            with self.condition:
+                while self.pending is None and not self.closed:
+                    self.condition.wait()
+                if self.pending is None:
+                    return
+                snapshot, self.pending = self.pending, None
+                self.writing = True
+            try:
+                self._write(snapshot)
+            except Exception as error:
+                self.error = error
+            with self.condition:
+                self.writing = False
+                self.condition.notify_all()
+
+    def _write(self, snapshot):
+        path = os.path.join(self.directory, f"{self.prefix}_{snapshot['epoch']:06d}.pt")
+        with open(path + ".tmp", "wb") as f:
+            torch.save(snapshot, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+        for old in self.paths()[:-self.keep]:
+            os.remove(old)
+
+    def flush(self):
+        # Blocks until every submitted snapshot is on disk
+        with self.condition:
+            while self.pending is not None or self.writing:
+                self.condition.wait()
+        if self.error is not None:
+            raise RuntimeError("checkpoint writer failed") from self.error
+
+    def close(self):
+        self.flush()
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        self.thread.join()
+
+    def load_latest(self):
+        # Newest readable checkpoint, skipping any that fail to load
+        for path in reversed(self.paths()):
+            try:
+                return torch.load(path, map_location="cpu", weights_only=False)
+            except Exception:
+                continue
+        return None
+
+    def resume(self, model, optimizer):
+        # Restores model, optimizer and RNG state in place; returns the checkpoint (epoch, history, extra) or None
+        checkpoint = self.load_latest()
+        if checkpoint is None:
+            return None
+        model.load_state_dict(checkpoint["model"])
+        optimizer.load_state_dict(checkpoint["optimizer"]) # moves momentum buffers to the parameters' device
+        set_rng_state(checkpoint["rng"])
+        return checkpoint
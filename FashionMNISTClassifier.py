@@ -1,129 +1,93 @@
 import torch
-device = "cuda" if torch.cuda.is_available() else "cpu"
-print("Using {} device".format(device))
-
-%matplotlib inline
-import torch
 from torch import nn
-from torch.utils.data import DataLoader
-from torchvision import datasets
-from torchvision.transforms import ToTensor, Lambda, Compose
-import matplotlib.pyplot as plt
-
-training_data = datasets.FashionMNIST(
-    root="data",
-    train=True,
-    download=True,
-    transform=ToTensor(),
-)
-
-test_data = datasets.FashionMNIST(
-    root="data",
-    train=False,
-    download=True,
-    transform=ToTensor(),
-)
-
-batch_size = 64
-
-# Create data loaders.
-train_dataloader = DataLoader(training_data, batch_size=batch_size)
-test_dataloader = DataLoader(test_data, batch_size=batch_size)
-
-for X, y in test_dataloader:
-    print("Shape of X [N, C, H, W]: ", X.shape)
-    print("Shape of y: ", y.shape, y.dtype)
-    break
-
-
-device = "cuda" if torch.cuda.is_available() else "cpu"
-print("Using {} device".format(device))
-
-class NeuralNetwork(nn.Module):
-    def __init__(self):
-        super(NeuralNetwork, self).__init__()
-        self.flatten = nn.Flatten()
-        self.linear_relu_stack = nn.Sequential(
-            nn.Linear(28*28, 512),
-            nn.ReLU(),
-            nn.Linear(512, 512),
-            nn.ReLU(),
-            nn.Linear(512, 10),
-            nn.ReLU()
-        )
-
-    def forward(self, x):
-        x = self.flatten(x)
-        logits = self.linear_relu_stack(x)
-        return logits
-
-model = NeuralNetwork().to(device)
-print(model)
-
-loss_fn = nn.CrossEntropyLoss()
-learning_rate = 1e-3
-optimizer = torch.optim.SGD(model.parameters(), lr=learning_rate)
-
-def train(dataloader, model, loss_fn, optimizer):
-    size = len(dataloader.dataset)
-    for batch, (X, y) in enumerate(dataloader):
-        X, y = X.to(device), y.to(device)
-
-        pred = model(X)
-        loss = loss_fn(pred, y)
-
-        optimizer.zero_grad()
-        loss.backward()
-        optimizer.step()
-
-        if batch % 100 == 0:
-            loss, current = loss.item(), batch * len(X)
-            print(f"loss: {loss:>7f}  [{current:>5d}/{size:>5d}]")
-
-def test(dataloader, model):
-    size = len(dataloader.dataset)
+from FashionMNISTData import BatchIterator, load_raw
+from FashionMNISTModel import NeuralNetwork, train, test, classes
+
+# Guarded: tune_batch_size times candidates in spawned processes, which re-import this script
+if __name__ == "__main__":
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    print("Using {} device".format(device))
+
+    training_data = load_raw(root="data", train=True)
+
+    test_data = load_raw(root="data", train=False)
+
+    batch_size = 64
+    learning_rate = 1e-3
+    epochs = 10
+    tune_batch_size = False # time short train/test bursts once per host and use the fastest batch size and thread counts
+    mixed_precision = False # bfloat16 autocast for forward and loss; weights and optimizer.step() stay fp32
+    augmentation = False # random shifts and flips on each whole batch, seeded, just before model(X)
+    compile_graph = False # torch.compile the whole train step and the inference model; falls back to eager if unavailable
+
+    if tune_batch_size:
+        from FashionMNISTTuner import tuned_settings, apply_settings
+        settings = tuned_settings(base_batch_size=batch_size, base_learning_rate=learning_rate, rule="linear")
+        apply_settings(settings)
+        batch_size, learning_rate = settings["batch_size"], settings["learning_rate"]
+        print(f"Tuned: batch_size={batch_size}, learning_rate={learning_rate:g}, threads={settings['threads']}")
+
+    # Create data loaders. Batches are sliced straight from the memory-mapped tensors.
+    train_dataloader = BatchIterator(training_data, batch_size=batch_size, device=device)
+    test_dataloader = BatchIterator(test_data, batch_size=batch_size, device=device)
+
+    for X, y in test_dataloader:
+        print("Shape of X [N, C, H, W]: ", X.shape)
+        print("Shape of y: ", y.shape, y.dtype)
+        break
+
+    model = NeuralNetwork().to(device)
+    print(model)
+
+    loss_fn = nn.CrossEntropyLoss()
+    optimizer = torch.optim.SGD(model.parameters(), lr=learning_rate)
+
+    augment = None
+    if augmentation:
+        from FashionMNISTAugment import BatchAugment
+        augment = BatchAugment(shift=2, flip=0.5, seed=0)
+
+    if compile_graph:
+        from FashionMNISTCompile import TrainStep, compile_model, compiled_train, compiled_test
+        train_step = TrainStep(model, loss_fn, optimizer)
+        inference_model, mode = compile_model(model, batch_size)
+        model.train()
+
+    from FashionMNISTCheckpoint import CheckpointManager
+    from FashionMNISTResults import trial_key
+    #one directory per configuration, so changing the batch size, learning rate or a flag starts a fresh run; the epoch count
+    #is left out of the key so raising it continues a finished run
+    run_key = trial_key({"batch_size": batch_size, "learning_rate": learning_rate, "mixed_precision": mixed_precision,
+                         "augmentation": augmentation, "compile_graph": compile_graph})
+    checkpoints = CheckpointManager(f"data/checkpoints/classifier/{run_key}", every_epochs=1, keep=3) #written on a background thread
+    resumed = checkpoints.resume(model, optimizer) #continues an interrupted run
+    for group in optimizer.param_groups:
+        group["lr"] = learning_rate #the optimizer state restores the checkpoint's lr; the configured one wins
+    start_epoch = resumed["epoch"] if resumed is not None else 0
+    history = resumed["history"] if resumed is not None else []
+
+    for t in range(start_epoch, epochs):
+        print(f"Epoch {t+1}\n-------------------------------")
+        if compile_graph:
+            # Fixed batch shape (short final batch padded) so neither graph recompiles
+            compiled_train(train_dataloader, train_step, batch_size)
+            accuracy, avg_loss = compiled_test(test_dataloader, inference_model, loss_fn, batch_size)
+        else:
+            train(train_dataloader, model, loss_fn, optimizer, bf16=mixed_precision, augment=augment)
+            accuracy, avg_loss = test(test_dataloader, model, loss_fn, bf16=mixed_precision)
+        history.append({"epoch": t+1, "accuracy": accuracy, "avg_loss": avg_loss})
+        checkpoints.save(t+1, model, optimizer, history=history, force=t == epochs-1)
+
+    checkpoints.close()
+    print("Done!")  
+
+    torch.save(model.state_dict(), "data/model.pth")
+
+    model.load_state_dict(torch.load("data/model.pth"))
+
     model.eval()
-    test_loss, correct = 0, 0
+    x, y = test_data[0][0], test_data[0][1]
     with torch.no_grad():
-        for X, y in dataloader:
-            X, y = X.to(device), y.to(device)
-            pred = model(X)
-            test_loss += loss_fn(pred, y).item()
-            correct += (pred.argmax(1) == y).type(torch.float).sum().item()
-    test_loss /= size
-    correct /= size
-    print(f"Test Error: \n Accuracy: {(100*correct):>0.1f}%, Avg loss: {test_loss:>8f} \n")
-    return 100*correct, test_loss # accuracy and avg loss
-
-
-for t in range(epochs):
-    print(f"Epoch {t+1}\n-------------------------------")
-    train(train_dataloader, model, loss_fn, optimizer)
-    accuracy, avg_loss = test(test_dataloader, model)
-    
-print("Done!")  
-
-model = NeuralNetwork()
-torch.save(model.state_dict(), "data/model.pth")
-
-model.load_state_dict(torch.load("data/model.pth"))
-
-classes = [
-    "T-shirt/top",
-    "Trouser",
-    "Pullover",
-    "Dress",
-    "Coat",
-    "Sandal",
-    "Shirt",
-    "Sneaker",
-    "Bag",
-    "Ankle boot",
-]
-
-model.eval()
-x, y = test_data[0][0], test_data[0][1]
-with torch.no_grad():
-    pred = model(x)
-    predicted, actual = classes[pred[0].argmax(0)], classes[y]
-    print(f'Predicted: "{predicted}", Actual: "{actual}"')
+        pred = model(x.to(device))
+        predicted, actual = classes[pred[0].argmax(0)], classes[y]
+        print(f'Predicted: "{predicted}", Actual: "{actual}"')
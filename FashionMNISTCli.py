@@ -0,0 +1,354 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+# Only the standard library at import time: every subcommand imports what it needs, so `predict` never
+# pays for torch, torchvision or matplotlib and `train` never pays for matplotlib unless --plot is given.
+
+
+def _device(name):
+    if name != "auto":
+        return name
+    import torch
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+
+def _pyplot():
+    # Headless: figures are only ever written to files, so no display or notebook backend is needed
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def _plot_history(path, accuracies, avg_losses, title=""):
+    plt = _pyplot()
+    epochs = range(1, len(accuracies) + 1)
+    fig, ax = plt.subplots(figsize=(10, 6))
+    ax.plot(epochs, accuracies, color="skyblue", linewidth=2, label="Accuracy (%)")
+    ax.plot(epochs, [loss * 1000 for loss in avg_losses], color="salmon", linewidth=2, label="Average Loss (magnified by 1000x)")
+    ax.set_xlabel("Epoch")
+    ax.set_title(title)
+    ax.legend()
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    fig.savefig(path)
+    plt.close(fig)
+
+
+def _resume(directory, model, optimizer, architecture, config, seed, patience=None, **options):
+    # Checkpoints live in a subdirectory of `directory` keyed like sweep trials (architecture, hyperparameters,
+    # seed; not the epoch count, so raising it continues a finished run), so changing a flag starts a fresh run
+    # instead of loading mismatched weights. Returns (CheckpointManager or None, resumed checkpoint or None).
+    if not directory:
+        return None, None
+    from FashionMNISTCheckpoint import CheckpointManager
+    from FashionMNISTResults import trial_key
+    checkpoints = CheckpointManager(os.path.join(directory, trial_key(config, seed, architecture, patience)), **options)
+    resumed = checkpoints.resume(model, optimizer)
+    for group in optimizer.param_groups:
+        group["lr"] = config["learning_rate"] # the optimizer state restores the checkpoint's lr; the configured one wins
+    return checkpoints, resumed
+
+
+def train_command(args):
+    import torch
+    from torch import nn
+    from FashionMNISTData import BatchIterator, load_raw
+    from FashionMNISTModel import NeuralNetwork, train, test
+
+    device = _device(args.device)
+    print(f"Using {device} device")
+    torch.manual_seed(args.seed)
+    train_dataloader = BatchIterator(load_raw(root=args.root, train=True), batch_size=args.batch_size, shuffle=True, device=device)
+    test_dataloader = BatchIterator(load_raw(root=args.root, train=False), batch_size=args.batch_size, device=device)
+    model = NeuralNetwork(args.layer1size, args.layer2size).to(device)
+    loss_fn = nn.CrossEntropyLoss()
+    optimizer = torch.optim.SGD(model.parameters(), lr=args.learning_rate, momentum=args.momentum)
+    augment = None
+    if args.augment:
+        from FashionMNISTAugment import BatchAugment
+        augment = BatchAugment(seed=args.seed)
+
+    config = {"layer1size": args.layer1size, "layer2size": args.layer2size, "learning_rate": args.learning_rate,
+              "batch_size": args.batch_size, "momentum": args.momentum, "bf16": args.bf16, "augment": args.augment}
+    checkpoints, resumed = _resume(args.checkpoints, model, optimizer, "NeuralNetwork", config, args.seed, every_epochs=1)
+    start_epoch = resumed["epoch"] if resumed is not None else 0
+    history = resumed["history"] if resumed is not None else {"accuracies": [], "avg_losses": []}
+    for t in range(start_epoch, args.epochs):
+        print(f"Epoch {t+1}\n-------------------------------")
+        train(train_dataloader, model, loss_fn, optimizer, bf16=args.bf16, augment=augment)
+        accuracy, avg_loss = test(test_dataloader, model, loss_fn, bf16=args.bf16)
+        history["accuracies"].append(accuracy)
+        history["avg_losses"].append(avg_loss)
+        if checkpoints is not None:
+            checkpoints.save(t+1, model, optimizer, history=history, force=t == args.epochs-1)
+    if checkpoints is not None:
+        checkpoints.close()
+
+    os.makedirs(os.path.dirname(args.save) or ".", exist_ok=True)
+    torch.save(model.state_dict(), args.save)
+    print(f"Saved PyTorch Model state to {args.save}")
+    if args.plot:
+        _plot_history(args.plot, history["accuracies"], history["avg_losses"], f"{args.layer1size}-{args.layer2size}")
+
+
+def sweep_command(args):
+    from FashionMNISTSweep import expand_grid, format_table, run_sweep, successive_halving
+
+    device = _device(args.device)
+    grid = expand_grid(layer1size=args.layer1sizes, layer2size=args.layer2sizes,
+                       learning_rate=args.learning_rates, batch_size=args.batch_sizes)
+    if args.halving:
+        results = successive_halving(grid, min_epochs=1, max_epochs=args.epochs, eta=3, workers=args.workers,
+                                     threads_per_worker=args.threads_per_worker, root=args.root, device=device, store=args.store or None)
+    else:
+        results = run_sweep(grid, args.epochs, workers=args.workers, threads_per_worker=args.threads_per_worker,
+                            root=args.root, device=device, store=args.store or None)
+    print(format_table(results))
+    if args.plot:
+        for result in results:
+            name = f"{result['layer1size']}-{result['layer2size']}_lr{result['learning_rate']:g}_bs{result['batch_size']}"
+            _plot_history(os.path.join(args.plot, f"{name}.png"), result["accuracies"], result["avg_losses"], name)
+
+
+def analyze_command(args):
+    import numpy as np
+    import torch
+    from torch import nn
+    from FashionMNISTContributions import contribution_epoch
+    from FashionMNISTData import BatchIterator, load_raw
+    from FashionMNISTInstrument import Instrument, format_summary
+    from FashionMNISTMetrics import ArrayBuffer, PolynomialFit
+    from FashionMNISTModel import AnalysisNetwork, NeuralNetwork, train
+    from FashionMNISTSweep import EarlyStopping
+
+    device = _device(args.device)
+    torch.manual_seed(args.seed)
+    train_dataloader = BatchIterator(load_raw(root=args.root, train=True), batch_size=args.batch_size, shuffle=True, device=device)
+    test_dataloader = BatchIterator(load_raw(root=args.root, train=False), batch_size=args.batch_size, shuffle=True, device=device)
+    if args.architecture == "analysis":
+        model = AnalysisNetwork(args.width, args.hidden_layers).to(device)
+        config = {"width": args.width, "hidden_layers": args.hidden_layers}
+    else:
+        model = NeuralNetwork(args.layer1size, args.layer2size).to(device)
+        config = {"layer1size": args.layer1size, "layer2size": args.layer2size}
+    config.update(learning_rate=args.learning_rate, batch_size=args.batch_size, momentum=args.momentum)
+    loss_fn = nn.CrossEntropyLoss()
+    optimizer = torch.optim.SGD(model.parameters(), lr=args.learning_rate, momentum=args.momentum)
+
+    variation_history, accuracy_history = ArrayBuffer(args.epochs), ArrayBuffer(args.epochs)
+    fit = PolynomialFit(degree=2)
+    stopper = EarlyStopping(patience=args.patience)
+    instrument = Instrument(enabled=args.profile, log=os.path.join(args.root, "phases.jsonl"))
+    plotter = None
+    if args.plots:
+        from FashionMNISTMetrics import PlotWorker
+        plotter = PlotWorker(args.plots, every=args.plot_every)
+    checkpoints, resumed = _resume(args.checkpoints, model, optimizer, type(model).__name__, config, args.seed,
+                                   patience=args.patience, every_epochs=10, every_seconds=600)
+
+    start_epoch, stopping = 0, False
+    if resumed is not None:
+        start_epoch = resumed["epoch"]
+        for accuracy, variation in zip(resumed["history"]["accuracies"], resumed["history"]["variations"]):
+            accuracy_history.append(accuracy)
+            variation_history.append(variation)
+            fit.update(accuracy, variation)
+        vars(stopper).update(resumed["extra"]["stopper"])
+        stopping = resumed["extra"]["stopping"]
+        print(f"Resumed after epoch {start_epoch}")
+    for t in range(start_epoch, start_epoch if stopping else args.epochs):
+        train(train_dataloader, model, loss_fn, optimizer, verbose=False, instrument=instrument)
+        contributions, accuracy, _, sample_summary = contribution_epoch(test_dataloader, model, loss_fn, optimizer,
+                                                                        args.per_sample, instrument)
+        with instrument.phase("plotting"):
+            variation = np.std(np.concatenate(contributions))
+            variation_history.append(variation)
+            accuracy_history.append(accuracy)
+            fit.update(accuracy, variation)
+            stopping = stopper.step(accuracy)
+            if plotter is not None:
+                plotter.submit(t+1, accuracy_history.values, variation_history.values, fit.coefficients(), contributions,
+                               force=stopping or t == args.epochs-1)
+        line = {"epoch": t+1, "accuracy": 100 * accuracy, "variation": float(variation)}
+        if sample_summary is not None:
+            line["per_sample_std"] = float(np.mean(np.concatenate([np.sqrt(var) for var in sample_summary["var"]])))
+        print(json.dumps(line))
+        if args.profile:
+            print(format_summary(instrument.end_epoch(t+1, accuracy=accuracy)))
+        if checkpoints is not None:
+            checkpoints.save(t+1, model, optimizer,
+                             history={"accuracies": accuracy_history.values, "variations": variation_history.values},
+                             extra={"stopper": vars(stopper), "stopping": stopping}, force=stopping or t == args.epochs-1)
+        if stopping:
+            print(f"Accuracy plateaued at {(100*stopper.best):>0.1f}% (epoch {stopper.best_epoch}), stopping early")
+            break
+    instrument.close()
+    if plotter is not None:
+        plotter.close()
+    if checkpoints is not None:
+        checkpoints.close()
+    if args.save:
+        torch.save(model.state_dict(), args.save)
+
+
+def _numpy_model(model_path):
+    # The .npz export sits next to the checkpoint and is refreshed when the checkpoint is newer,
+    # so only the first predict after training imports torch
+    from FashionMNISTNumpy import NumpyMLP, export_npz
+    npz_path = os.path.splitext(model_path)[0] + ".npz"
+    if not os.path.exists(npz_path) or os.path.getmtime(npz_path) < os.path.getmtime(model_path):
+        export_npz(model_path, npz_path)
+    return NumpyMLP(npz_path)
+
+
+def _test_images(root):
+    # The raw t10k IDX files read with numpy alone: 16-byte header for images, 8 for labels
+    import numpy as np
+    raw = os.path.join(root, "FashionMNIST", "raw")
+    images = np.memmap(os.path.join(raw, "t10k-images-idx3-ubyte"), dtype=np.uint8, mode="r", offset=16).reshape(-1, 28, 28)
+    labels = np.memmap(os.path.join(raw, "t10k-labels-idx1-ubyte"), dtype=np.uint8, mode="r", offset=8)
+    return images, labels
+
+
+def predict_command(args):
+    import numpy as np
+    from FashionMNISTLabels import classes
+
+    model = _numpy_model(args.model)
+    names, images, actual = [], [], []
+    for path in args.images:
+        # .npy of [28, 28] or [N, 28, 28]; integer pixels (0-255, any integer dtype) or floats in [0, 1]
+        array = np.load(path)
+        array = array.reshape(-1, 28, 28)
+        names += [path if len(array) == 1 else f"{path}[{i}]" for i in range(len(array))]
+        images.append(array.astype(np.float32) / 255 if np.issubdtype(array.dtype, np.integer) else array.astype(np.float32))
+        actual += [None] * len(array)
+    if args.index:
+        test_images, test_labels = _test_images(args.root)
+        names += [f"test[{i}]" for i in args.index]
+        images.append(test_images[args.index].astype(np.float32) / 255)
+        actual += [classes[test_labels[i]] for i in args.index]
+    if not names:
+        raise SystemExit("nothing to predict: pass .npy files and/or --index")
+
+    logits = model.forward(np.concatenate(images)).copy()
+    probabilities = np.exp(logits - logits.max(1, keepdims=True))
+    probabilities /= probabilities.sum(1, keepdims=True)
+    for name, row, truth in zip(names, probabilities, actual):
+        index = int(row.argmax())
+        if args.json:
+            print(json.dumps({"input": name, "label": classes[index], "probability": float(row[index]), "actual": truth}))
+        else:
+            suffix = f', Actual: "{truth}"' if truth is not None else ""
+            print(f'{name}: Predicted: "{classes[index]}" ({100 * row[index]:.1f}%){suffix}')
+
+
+def check_startup_command(args):
+    # Times `predict` end to end in fresh interpreters (the first run may export the .npz and is not counted)
+    # and fails when the median exceeds the budget or when torch, torchvision or matplotlib got imported
+    code = ("import sys, FashionMNISTCli; FashionMNISTCli.main(sys.argv[1:]); "
+            "heavy = [m for m in ('torch', 'torchvision', 'matplotlib') if m in sys.modules]; "
+            "sys.exit(f'imported {heavy}') if heavy else None")
+    command = [sys.executable, "-c", code, "predict", "--model", args.model, "--root", args.root, "--index", "0"]
+    here = os.path.dirname(os.path.abspath(__file__))
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [here, os.environ.get("PYTHONPATH")]))}
+    subprocess.run(command, check=True, env=env, stdout=subprocess.DEVNULL)
+    timings = []
+    for _ in range(args.runs):
+        start = time.perf_counter()
+        result = subprocess.run(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        timings.append(time.perf_counter() - start)
+        if result.returncode:
+            print(result.stderr.strip())
+            return 1
+    timings.sort()
+    median = timings[len(timings) // 2]
+    print(f"predict startup: median {median * 1000:.0f} ms, best {timings[0] * 1000:.0f} ms over {args.runs} runs "
+          f"(budget {args.budget * 1000:.0f} ms)")
+    return 0 if median <= args.budget else 1
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="FashionMNISTCli.py", description="FashionMNIST training, sweeps, analysis and prediction")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    def common(command):
+        command.add_argument("--root", default="data")
+        command.add_argument("--device", default="auto", help="cpu, cuda, mps or auto")
+        command.add_argument("--seed", type=int, default=0)
+        return command
+
+    command = common(commands.add_parser("train", help="train NeuralNetwork and save its state_dict"))
+    command.add_argument("--epochs", type=int, default=5)
+    command.add_argument("--batch-size", type=int, default=64)
+    command.add_argument("--learning-rate", type=float, default=1e-3)
+    command.add_argument("--momentum", type=float, default=0.0)
+    command.add_argument("--layer1size", type=int, default=512)
+    command.add_argument("--layer2size", type=int, default=512)
+    command.add_argument("--bf16", action="store_true", help="bfloat16 autocast for forward and loss")
+    command.add_argument("--augment", action="store_true", help="batched random shifts and flips")
+    command.add_argument("--checkpoints", help="directory for resumable per-epoch checkpoints (one subdirectory per configuration)")
+    command.add_argument("--save", default="data/model.pth")
+    command.add_argument("--plot", help="write the accuracy/loss curve to this PNG")
+    command.set_defaults(func=train_command)
+
+    command = common(commands.add_parser("sweep", help="grid search over layer sizes, learning rates and batch sizes"))
+    command.add_argument("--epochs", type=int, default=3)
+    command.add_argument("--layer1sizes", type=int, nargs="+", default=[256, 512, 1024])
+    command.add_argument("--layer2sizes", type=int, nargs="+", default=[256, 512, 1024])
+    command.add_argument("--learning-rates", type=float, nargs="+", default=[1e-3])
+    command.add_argument("--batch-sizes", type=int, nargs="+", default=[64])
+    command.add_argument("--halving", action="store_true", help="successive halving instead of the full grid")
+    command.add_argument("--workers", type=int)
+    command.add_argument("--threads-per-worker", type=int, default=1)
+    command.add_argument("--store", default="data/trials.sqlite", help="SQLite trial store (reuse and resume trials)")
+    command.add_argument("--plot", help="write one accuracy/loss PNG per trial into this directory")
+    command.set_defaults(func=sweep_command)
+
+    command = common(commands.add_parser("analyze", help="track neuron contributions against accuracy while training"))
+    command.add_argument("--epochs", type=int, default=1000)
+    command.add_argument("--patience", type=int, default=50)
+    command.add_argument("--batch-size", type=int, default=64)
+    command.add_argument("--learning-rate", type=float, default=1e-3)
+    command.add_argument("--momentum", type=float, default=0.5,
+                         help="contributions are read from the momentum buffers, or from the gradients when this is 0")
+    command.add_argument("--architecture", choices=["analysis", "classifier"], default="analysis",
+                         help="analysis: FashionMNISTAnalysis.py's 784-512x4-10 network (--width, --hidden-layers); "
+                              "classifier: NeuralNetwork (--layer1size, --layer2size)")
+    command.add_argument("--width", type=int, default=512)
+    command.add_argument("--hidden-layers", type=int, default=4)
+    command.add_argument("--layer1size", type=int, default=512)
+    command.add_argument("--layer2size", type=int, default=512)
+    command.add_argument("--per-sample", action="store_true", help="also track per-sample contribution variance")
+    command.add_argument("--plots", help="render charts to PNGs in this directory (background process)")
+    command.add_argument("--plot-every", type=int, default=10)
+    command.add_argument("--profile", action="store_true", help="per-phase timings, appended to phases.jsonl under --root")
+    command.add_argument("--checkpoints", help="directory for resumable checkpoints (one subdirectory per configuration)")
+    command.add_argument("--save", help="write the final state_dict here")
+    command.set_defaults(func=analyze_command)
+
+    command = commands.add_parser("predict", help="classify images with a saved checkpoint (numpy only, no torch import)")
+    command.add_argument("images", nargs="*", help=".npy files of [28, 28] or [N, 28, 28] images")
+    command.add_argument("--index", type=int, nargs="+", help="test-set indices to classify")
+    command.add_argument("--model", default="data/model.pth")
+    command.add_argument("--root", default="data")
+    command.add_argument("--json", action="store_true")
+    command.set_defaults(func=predict_command)
+
+    command = commands.add_parser("check-startup", help="fail if predict takes longer than --budget seconds to run")
+    command.add_argument("--model", default="data/model.pth")
+    command.add_argument("--root", default="data")
+    command.add_argument("--budget", type=float, default=1.0)
+    command.add_argument("--runs", type=int, default=5)
+    command.set_defaults(func=check_startup_command)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
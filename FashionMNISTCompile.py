@@ -0,0 +1,133 @@
+import argparse
+import time
+import warnings
+
+import torch
+from torch import nn
+
+from FashionMNISTModel import NeuralNetwork, model_device
+
+
+def compile_model(model, batch_size=64, modes=("compile", "script")):
+    # Inference graph: torch.compile first, TorchScript if that fails, eager as the last resort.
+    # A real call on a fixed-shape example surfaces compiler errors here instead of mid-run.
+    example = torch.rand(batch_size, 1, 28, 28, device=model_device(model))
+    for mode in modes:
+        try:
+            compiled = torch.compile(model, dynamic=False) if mode == "compile" else torch.jit.script(model)
+            with torch.no_grad():
+                compiled(example)
+            return compiled, mode
+        except Exception as error:
+            warnings.warn(f"{mode} unavailable, falling back: {type(error).__name__}: {error}")
+    return model, "eager"
+
+
+class TrainStep:
+    # forward + loss + backward + optimizer.step() as one callable, compiled with torch.compile on first use.
+    # If compilation fails the step runs eagerly from then on, so training never stops because of the compiler.
+    def __init__(self, model, loss_fn, optimizer, compile=True):
+        self.model, self.loss_fn, self.optimizer = model, loss_fn, optimizer
+        self.compiled = torch.compile(self._step, dynamic=False) if compile else None
+        self.mode = "compile" if compile else "eager"
+
+    def _step(self, X, y):
+        pred = self.model(X)
+        loss = self.loss_fn(pred, y)
+        self.optimizer.zero_grad()
+        loss.backward()
+        self.optimizer.step()
+        return loss.detach()
+
+    def __call__(self, X, y):
+        if self.compiled is not None:
+            try:
+                return self.compiled(X, y)
+            except Exception as error:
+                warnings.warn(f"compiled train step failed, running eagerly: {type(error).__name__}: {error}")
+                self.compiled, self.mode = None, "eager"
+        return self._step(X, y)
+
+
+def padded_batches(dataloader, batch_size, ignore_index=-100):
+    # Pads the short final batch to batch_size so compiled graphs see one shape and never recompile.
+    # Padded targets use CrossEntropyLoss's ignore_index, so they add nothing to the loss, gradient or accuracy.
+    for X, y in dataloader:
+        pad = batch_size - len(y)
+        if pad > 0:
+            X = torch.cat([X, X.new_zeros((pad, *X.shape[1:]))])
+            y = torch.cat([y, y.new_full((pad,), ignore_index)])
+        yield X, y
+
+
+def compiled_train(dataloader, step, batch_size, verbose=True):
+    size = len(dataloader.dataset)
+    device = model_device(step.model)
+    step.model.train()
+    for batch, (X, y) in enumerate(padded_batches(dataloader, batch_size)):
+        loss = step(X.to(device), y.to(device))
+        if verbose and batch % 100 == 0:
+            loss, current = loss.item(), batch * batch_size
+            print(f"loss: {loss:>7f}  [{current:>5d}/{size:>5d}]")
+
+
+def compiled_test(dataloader, model, loss_fn, batch_size, verbose=True):
+    # Same (accuracy, avg_loss) as test(), run through a fixed-shape compiled inference model
+    size = len(dataloader.dataset)
+    device = model_device(model)
+    model.eval()
+    test_loss = torch.zeros((), dtype=torch.float64, device=device)
+    correct = torch.zeros((), dtype=torch.int64, device=device)
+    with torch.no_grad():
+        for X, y in padded_batches(dataloader, batch_size):
+            X, y = X.to(device), y.to(device)
+            pred = model(X)
+            test_loss += loss_fn(pred, y)
+            correct += (pred.argmax(1) == y).sum()
+    accuracy, test_loss = 100 * correct.item() / size, test_loss.item() / size
+    if verbose:
+        print(f"Test Error: \n Accuracy: {accuracy:>0.1f}%, Avg loss: {test_loss:>8f} \n")
+    return accuracy, test_loss
+
+
+def _time(fn, repeats):
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) / repeats * 1000
+
+
+def benchmark(batch_size=64, repeats=200):
+    X, y = torch.rand(batch_size, 1, 28, 28), torch.randint(0, 10, (batch_size,))
+    loss_fn = nn.CrossEntropyLoss()
+    report = {}
+    for name, compile in (("eager", False), ("compiled", True)):
+        torch.manual_seed(0)
+        model = NeuralNetwork()
+        step = TrainStep(model, loss_fn, torch.optim.SGD(model.parameters(), lr=1e-3), compile=compile)
+        start = time.perf_counter()
+        step(X, y) # first call pays for compilation
+        warmup = time.perf_counter() - start
+        train_ms = _time(lambda: step(X, y), repeats)
+        model.eval()
+        if compile:
+            inference, mode = compile_model(model, batch_size)
+        else:
+            inference, mode = model, "eager"
+        with torch.no_grad():
+            predict_ms = _time(lambda: inference(X), repeats)
+        report[name] = {"train_step_ms": train_ms, "inference_ms": predict_ms, "first_call_s": warmup,
+                        "mode": step.mode if name == "eager" else f"{step.mode}/{mode}"}
+    print(f"{'':9}{'mode':>16}{'first call s':>14}{'train step ms':>15}{'inference ms':>14}")
+    for name, row in report.items():
+        print(f"{name:9}{row['mode']:>16}{row['first_call_s']:>14.2f}{row['train_step_ms']:>15.3f}{row['inference_ms']:>14.3f}")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Step latency of eager vs compiled NeuralNetwork on this host")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--repeats", type=int, default=200)
+    args = parser.parse_args()
+    benchmark(args.batch_size, args.repeats)
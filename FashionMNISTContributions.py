@@ -0,0 +1,123 @@
+import torch
+from torch.func import functional_call, grad, vmap
+
+from FashionMNISTInstrument import DISABLED
+
+
+class NeuronStats:
+    # Running per-neuron sum and sum of squares for a list of layers, kept in preallocated on-device tensors
+    def __init__(self, sizes, device):
+        self.total = [torch.zeros(size, device=device) for size in sizes]
+        self.total_sq = [torch.zeros_like(t) for t in self.total]
+        self.count = 0
+
+    def reset(self):
+        for t in self.total + self.total_sq:
+            t.zero_()
+        self.count = 0
+
+    def summary(self):
+        # One host transfer for the epoch: per-layer numpy arrays of the sum, mean and variance
+        count = max(self.count, 1)
+        means = [t / count for t in self.total]
+        variances = [(sq / count - m * m).clamp_(min=0) for sq, m in zip(self.total_sq, means)]
+        host = [t.cpu().numpy() for t in self.total + means + variances]
+        n = len(self.total)
+        return {"sum": host[:n], "mean": host[n:2 * n], "var": host[2 * n:]}
+
+
+class ContributionStats(NeuronStats):
+    # Per-neuron contribution of every hidden Linear layer, |W|.sum(1) + |b| of either the SGD momentum
+    # buffers (source="momentum", the metric test_loop has always used) or the current gradients
+    # (source="grad"). Buffers are read in place from optimizer.state / param.grad and accumulated
+    # once per batch; nothing reaches the host until summary() is called.
+    def __init__(self, optimizer, source="momentum"):
+        self.optimizer = optimizer
+        self.source = source
+        params = [p for group in optimizer.param_groups for p in group["params"]]
+        # (weight, bias) pairs in layer order, dropping the output layer like test_loop did
+        self.layers = [(params[i], params[i + 1]) for i in range(0, len(params) - 2, 2)]
+        super().__init__([w.shape[0] for w, _ in self.layers], params[0].device)
+        self.scratch = [torch.zeros_like(t) for t in self.total]
+
+    def _buffer(self, param):
+        if self.source == "grad":
+            return param.grad
+        return self.optimizer.state[param]["momentum_buffer"]
+
+    @torch.no_grad()
+    def update(self):
+        # Call once per batch after loss.backward()
+        for (w, b), total, total_sq, scratch in zip(self.layers, self.total, self.total_sq, self.scratch):
+            torch.linalg.vector_norm(self._buffer(w), ord=1, dim=1, out=scratch)
+            scratch.add_(self._buffer(b).abs())
+            total.add_(scratch)
+            total_sq.addcmul_(scratch, scratch)
+        self.count += 1
+
+
+class PerSampleContributionStats(NeuronStats):
+    # The same |dW|.sum(1) + |db| score, but per example: torch.func.vmap(grad(...)) gives every sample's
+    # gradients for a whole batch in one vectorized call, so mean and variance across samples are exact
+    # without running batch size 1. chunk_size bounds the memory of the per-sample gradients.
+    def __init__(self, model, loss_fn, chunk_size=None):
+        self.model = model
+        self.loss_fn = loss_fn
+        names = [name for name, _ in model.named_parameters()]
+        self.layers = [(names[i], names[i + 1]) for i in range(0, len(names) - 2, 2)]
+        params = dict(model.named_parameters())
+        super().__init__([params[w].shape[0] for w, _ in self.layers], params[names[0]].device)
+
+        def sample_loss(params, buffers, x, target):
+            pred = functional_call(self.model, (params, buffers), (x.unsqueeze(0),))
+            return self.loss_fn(pred, target.unsqueeze(0))
+
+        self.per_sample_grads = vmap(grad(sample_loss), in_dims=(None, None, 0, 0), chunk_size=chunk_size)
+
+    def scores(self, X, y):
+        # [batch, neurons] contribution of each sample, per hidden layer
+        params = {name: p.detach() for name, p in self.model.named_parameters()}
+        buffers = {name: b.detach() for name, b in self.model.named_buffers()}
+        grads = self.per_sample_grads(params, buffers, X, y)
+        return [grads[w].abs().sum(2) + grads[b].abs() for w, b in self.layers]
+
+    @torch.no_grad()
+    def update(self, X, y):
+        for scores, total, total_sq in zip(self.scores(X, y), self.total, self.total_sq):
+            total.add_(scores.sum(0))
+            total_sq.add_((scores * scores).sum(0))
+        self.count += X.shape[0]
+
+
+def contribution_epoch(dataloader, model, loss_fn, optimizer, per_sample=False, instrument=DISABLED, source=None):
+    # One pass of the analysis test loop: loss and accuracy over the data plus each hidden neuron's summed
+    # contribution (and, with per_sample, the per-sample mean and variance). Loss and correct-count totals
+    # stay on-device like the contribution sums, so the host syncs once per epoch, not once per batch.
+    # source is passed to ContributionStats; by default the momentum buffers, or the gradients when the
+    # optimizer keeps none (SGD without momentum).
+    # Returns (contributions, accuracy in [0, 1], avg_loss, per-sample summary or None).
+    if source is None:
+        source = "momentum" if all(group.get("momentum", 0) for group in optimizer.param_groups) else "grad"
+    size = len(dataloader.dataset)
+    device = next(model.parameters()).device
+    test_loss = torch.zeros((), dtype=torch.float32 if device.type == "mps" else torch.float64, device=device)
+    correct = torch.zeros((), dtype=torch.int64, device=device)
+    stats = ContributionStats(optimizer, source)
+    sample_stats = PerSampleContributionStats(model, loss_fn) if per_sample else None
+    for X, y in instrument.timed(dataloader, "test_data"):
+        X, y = X.to(device), y.to(device)
+        with instrument.phase("test_forward_backward"):
+            pred = model(X)
+            loss = loss_fn(pred, y)
+            optimizer.zero_grad()
+            loss.backward()
+            test_loss += loss.detach()
+            correct += (pred.argmax(1) == y).sum()
+        with instrument.phase("contributions"):
+            stats.update()
+            if sample_stats is not None:
+                sample_stats.update(X, y)
+    with instrument.phase("contributions"):
+        contributions = stats.summary()["sum"]
+        sample_summary = sample_stats.summary() if sample_stats is not None else None
+    return contributions, correct.item() / size, test_loss.item() / size, sample_summary
@@ -0,0 +1,149 @@
+import os
+import numpy as np
+import torch
+
+
+class TensorDataset:
+    # Whole split held as one contiguous uint8 tensor; decoded once instead of per sample per epoch
+    def __init__(self, data, targets):
+        self.data = data.contiguous()
+        self.targets = targets.contiguous()
+
+    @classmethod
+    def from_torchvision(cls, dataset):
+        # torchvision's FashionMNIST already keeps the decoded uint8 images in .data
+        return cls(dataset.data, dataset.targets)
+
+    def to(self, device):
+        return type(self)(self.data.to(device), self.targets.to(device))
+
+    def __len__(self):
+        return self.data.shape[0]
+
+    def __getitem__(self, idx):
+        # Same layout as ToTensor(): [1, 28, 28] float in [0, 1]
+        return self.data[idx].unsqueeze(0).to(torch.float32).div_(255), int(self.targets[idx])
+
+
+def normalize(images):
+    # uint8 [N, 28, 28] -> float [N, 1, 28, 28] in [0, 1], matching ToTensor()
+    if images.dim() == 3:
+        images = images.unsqueeze(1)
+    return images.to(torch.float32).div_(255)
+
+
+class BatchIterator:
+    # Drop-in replacement for DataLoader in train()/test()/train_loop()/test_loop():
+    # exposes .dataset and yields (X, y) batches sliced straight out of the resident tensors.
+    # A sampler (e.g. DistributedSampler) decides the indices instead of shuffle, as in DataLoader.
+    def __init__(self, dataset, batch_size=64, shuffle=False, drop_last=False, device=None, generator=None, sampler=None):
+        if device is not None:
+            dataset = dataset.to(device)
+        self.dataset = dataset
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.drop_last = drop_last
+        self.generator = generator
+        self.sampler = sampler
+
+    def __len__(self):
+        size = len(self.sampler) if self.sampler is not None else len(self.dataset)
+        if self.drop_last:
+            return size // self.batch_size
+        return (size + self.batch_size - 1) // self.batch_size
+
+    def __iter__(self):
+        data, targets = self.dataset.data, self.dataset.targets
+        if self.sampler is not None:
+            order = torch.as_tensor(list(self.sampler), dtype=torch.int64, device=data.device)
+        elif self.shuffle:
+            order = torch.randperm(len(self.dataset), generator=self.generator).to(data.device)
+        else:
+            order = None
+        size = len(self.dataset) if order is None else len(order)
+        end = size - size % self.batch_size if self.drop_last else size
+        if order is not None:
+            for start in range(0, end, self.batch_size):
+                idx = order[start:start + self.batch_size]
+                yield normalize(data.index_select(0, idx)), targets.index_select(0, idx).to(torch.int64)
+        else:
+            for start in range(0, end, self.batch_size):
+                yield normalize(data[start:start + self.batch_size]), targets[start:start + self.batch_size].to(torch.int64)
+
+
+# Raw IDX files (the format torchvision leaves in data/FashionMNIST/raw)
+IDX_DTYPES = {0x08: np.uint8, 0x09: np.int8, 0x0B: np.dtype(">i2"), 0x0C: np.dtype(">i4"), 0x0D: np.dtype(">f4"), 0x0E: np.dtype(">f8")}
+
+
+def read_idx_header(path):
+    with open(path, "rb") as f:
+        header = f.read(4)
+        if len(header) != 4 or header[0] != 0 or header[1] != 0 or header[2] not in IDX_DTYPES:
+            raise ValueError(f"{path} is not an IDX file")
+        ndim = header[3]
+        shape = tuple(int(d) for d in np.frombuffer(f.read(4 * ndim), dtype=">i4"))
+    return IDX_DTYPES[header[2]], shape, 4 + 4 * ndim
+
+
+def read_idx(path):
+    # Memory-mapped, zero-copy view of an IDX file; pages are only read when a batch touches them.
+    # mode="c" (copy-on-write) keeps the file untouched while giving torch a writable buffer.
+    dtype, shape, offset = read_idx_header(path)
+    array = np.memmap(path, dtype=dtype, mode="c", offset=offset, shape=shape)
+    if array.dtype.itemsize > 1:
+        # Wider IDX types are big-endian on disk, which torch can't view directly
+        array = array.astype(array.dtype.newbyteorder("="))
+    return torch.from_numpy(array)
+
+
+def write_idx(path, array):
+    array = np.asarray(array)
+    code = next(k for k, v in IDX_DTYPES.items() if np.dtype(v).newbyteorder("=") == array.dtype.newbyteorder("="))
+    with open(path, "wb") as f:
+        f.write(bytes([0, 0, code, array.ndim]))
+        f.write(np.asarray(array.shape, dtype=">i4").tobytes())
+        f.write(np.ascontiguousarray(array, dtype=IDX_DTYPES[code]).tobytes())
+
+
+def raw_paths(root="data", train=True):
+    prefix = "train" if train else "t10k"
+    raw = os.path.join(root, "FashionMNIST", "raw")
+    return os.path.join(raw, f"{prefix}-images-idx3-ubyte"), os.path.join(raw, f"{prefix}-labels-idx1-ubyte")
+
+
+def load_raw(root="data", train=True, download=True):
+    images_path, labels_path = raw_paths(root, train)
+    if download and not (os.path.exists(images_path) and os.path.exists(labels_path)):
+        # Only pay for torchvision when the files actually have to be fetched
+        from torchvision import datasets
+        datasets.FashionMNIST(root=root, train=train, download=True)
+    return TensorDataset(read_idx(images_path), read_idx(labels_path))
+
+
+class ShardedIDXStream(torch.utils.data.IterableDataset):
+    # Streams batches from a list of (images, labels) IDX shard pairs, e.g. augmented or expanded
+    # variants written with write_idx that don't fit in RAM. Shards are split across DataLoader
+    # workers; use DataLoader(stream, batch_size=None) since batches are already assembled.
+    def __init__(self, shards, batch_size=64, shuffle=False, seed=0):
+        self.shards = list(shards)
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.seed = seed
+        self.epoch = 0
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def __len__(self):
+        return sum(read_idx_header(labels_path)[1][0] for _, labels_path in self.shards)
+
+    def __iter__(self):
+        worker = torch.utils.data.get_worker_info()
+        shards = self.shards if worker is None else self.shards[worker.id::worker.num_workers]
+        generator = torch.Generator().manual_seed(self.seed + self.epoch)
+        if self.shuffle:
+            shards = [shards[i] for i in torch.randperm(len(shards), generator=generator).tolist()]
+        for images_path, labels_path in shards:
+            batches = BatchIterator(TensorDataset(read_idx(images_path), read_idx(labels_path)),
+                                    batch_size=self.batch_size, shuffle=self.shuffle, generator=generator)
+            yield from batches
@@ -0,0 +1,163 @@
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import time
+
+import torch
+import torch.distributed as dist
+from torch import nn
+from torch.nn.parallel import DistributedDataParallel
+from torch.utils.data.distributed import DistributedSampler
+
+from FashionMNISTData import BatchIterator, load_raw
+from FashionMNISTModel import NeuralNetwork, model_device, train
+
+# Single-node defaults; a multi-node run passes the same keys in a JSON config file, e.g.
+# {"master_addr": "10.0.0.1", "master_port": 29500, "nnodes": 2, "node_rank": 0, "nproc_per_node": 8}
+DEFAULTS = {
+    "master_addr": "127.0.0.1",
+    "master_port": 29500,
+    "nnodes": 1,
+    "node_rank": 0,
+    "nproc_per_node": 1,
+    "epochs": 3,
+    "batch_size": 64, # global: split across all workers so the SGD step matches the single-process run
+    "learning_rate": 1e-3,
+    "seed": 0,
+    "root": "data",
+    "save": None,
+}
+
+
+def distributed_test(dataloader, model, loss_fn):
+    # Each rank scores its own shard; loss/correct sums and sample counts are all-reduced so every rank
+    # returns the (accuracy, avg_loss) test() would give on the whole test set
+    device = model_device(model)
+    model.eval()
+    totals = torch.zeros(3, dtype=torch.float64, device=device)
+    with torch.no_grad():
+        for X, y in dataloader:
+            X, y = X.to(device), y.to(device)
+            pred = model(X)
+            totals[0] += loss_fn(pred, y)
+            totals[1] += (pred.argmax(1) == y).sum()
+            totals[2] += len(y)
+    dist.all_reduce(totals)
+    test_loss, correct, size = totals.tolist()
+    return 100 * correct / size, test_loss / size
+
+
+def _worker(local_rank, config, results):
+    world_size = config["nnodes"] * config["nproc_per_node"]
+    rank = config["node_rank"] * config["nproc_per_node"] + local_rank
+    # Split the node's cores between its workers so gloo ranks don't oversubscribe
+    torch.set_num_threads(max(1, (os.cpu_count() or 1) // config["nproc_per_node"]))
+    dist.init_process_group("gloo", init_method=f"tcp://{config['master_addr']}:{config['master_port']}",
+                            rank=rank, world_size=world_size)
+    try:
+        torch.manual_seed(config["seed"])
+        training_data = load_raw(root=config["root"], train=True)
+        test_data = load_raw(root=config["root"], train=False)
+        sampler = DistributedSampler(training_data, num_replicas=world_size, rank=rank, shuffle=True, seed=config["seed"])
+        per_worker_batch = config["batch_size"] // world_size # launch() checks that this divides evenly
+        train_dataloader = BatchIterator(training_data, batch_size=per_worker_batch, sampler=sampler)
+        # test()'s avg_loss sums per-batch mean losses, so it depends on how samples are grouped into batches.
+        # Each rank takes whole batches of the single-process order (batches rank, rank + world_size, ...),
+        # so the all-reduced sums cover exactly the batches test() sees, each sample counted once.
+        test_batch = config["batch_size"]
+        test_batches = range(rank, (len(test_data) + test_batch - 1) // test_batch, world_size)
+        test_sampler = [i for b in test_batches for i in range(b * test_batch, min((b + 1) * test_batch, len(test_data)))]
+        test_dataloader = BatchIterator(test_data, batch_size=test_batch, sampler=test_sampler)
+
+        model = DistributedDataParallel(NeuralNetwork())
+        loss_fn = nn.CrossEntropyLoss()
+        optimizer = torch.optim.SGD(model.parameters(), lr=config["learning_rate"])
+
+        history = []
+        for t in range(config["epochs"]):
+            sampler.set_epoch(t)
+            dist.barrier()
+            start = time.perf_counter()
+            train(train_dataloader, model, loss_fn, optimizer, verbose=rank == 0)
+            dist.barrier()
+            seconds = time.perf_counter() - start
+            accuracy, avg_loss = distributed_test(test_dataloader, model, loss_fn)
+            history.append({"epoch": t + 1, "seconds": seconds, "accuracy": accuracy, "avg_loss": avg_loss})
+            if rank == 0:
+                print(f"Epoch {t+1}: {seconds:.2f}s, Accuracy: {accuracy:>0.1f}%, Avg loss: {avg_loss:>8f}")
+        if rank == 0:
+            if config["save"]:
+                torch.save(model.module.state_dict(), config["save"])
+            if results is not None:
+                results.put(history)
+    finally:
+        dist.destroy_process_group()
+
+
+def launch(config=None, **overrides):
+    # Starts this node's nproc_per_node workers; returns rank 0's per-epoch history when rank 0 is local
+    config = {**DEFAULTS, **(config or {}), **overrides}
+    world_size = config["nnodes"] * config["nproc_per_node"]
+    if config["batch_size"] % world_size:
+        # A rounded per-worker batch would silently change the global batch, and with it the SGD step
+        raise ValueError(f"batch_size {config['batch_size']} does not split evenly across {world_size} workers")
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue() if config["node_rank"] == 0 else None
+    processes = [context.Process(target=_worker, args=(local_rank, config, results))
+                 for local_rank in range(config["nproc_per_node"])]
+    for process in processes:
+        process.start()
+    history = None
+    # Poll rather than block so a crashed rank 0 can't leave us waiting forever
+    while results is not None and history is None and processes[0].is_alive():
+        try:
+            history = results.get(timeout=1)
+        except queue.Empty:
+            pass
+    if results is not None and history is None and not results.empty():
+        history = results.get()
+    for process in processes:
+        process.join()
+    if any(process.exitcode for process in processes):
+        raise RuntimeError("a distributed worker failed")
+    return history
+
+
+def scaling_table(worker_counts=(1, 2, 4, 8), epochs=1, **overrides):
+    # Same global batch for every worker count; efficiency = T(1) / (n * T(n)) on mean epoch time
+    rows = []
+    for n in worker_counts:
+        history = launch(nproc_per_node=n, epochs=epochs, **overrides)
+        seconds = sum(row["seconds"] for row in history) / len(history)
+        rows.append({"workers": n, "seconds": seconds, "accuracy": history[-1]["accuracy"], "avg_loss": history[-1]["avg_loss"]})
+    print(f"{'workers':>8}{'epoch s':>10}{'speedup':>9}{'efficiency':>12}{'accuracy':>10}")
+    for row in rows:
+        row["speedup"] = rows[0]["seconds"] * rows[0]["workers"] / row["seconds"]
+        row["efficiency"] = row["speedup"] / row["workers"]
+        print(f"{row['workers']:>8d}{row['seconds']:>10.2f}{row['speedup']:>8.2f}x{100 * row['efficiency']:>11.0f}%{row['accuracy']:>9.1f}%")
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Data-parallel CPU training with DistributedDataParallel over gloo")
+    parser.add_argument("--config", help="JSON file with any of: " + ", ".join(DEFAULTS))
+    parser.add_argument("--workers", type=int, help="worker processes on this node (nproc_per_node)")
+    parser.add_argument("--epochs", type=int)
+    parser.add_argument("--save", help="write rank 0's trained state_dict here")
+    parser.add_argument("--scaling", type=int, nargs="*", help="report scaling efficiency for these worker counts")
+    args = parser.parse_args()
+
+    config = {}
+    if args.config:
+        with open(args.config) as f:
+            config = json.load(f)
+    for key, value in (("nproc_per_node", args.workers), ("epochs", args.epochs), ("save", args.save)):
+        if value is not None:
+            config[key] = value
+    if args.scaling is not None:
+        config.pop("nproc_per_node", None)
+        scaling_table(args.scaling or (1, 2, 4, 8), **config)
+    else:
+        launch(config)
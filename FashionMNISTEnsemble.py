@@ -0,0 +1,92 @@
+import copy
+
+import torch
+from torch.func import functional_call, stack_module_state, vmap
+
+from FashionMNISTModel import NeuralNetwork
+
+
+class EnsembleTrainer:
+    # Trains K same-shaped NeuralNetworks at once: their parameters are stacked along a leading member
+    # dimension and one vmap'd forward/backward serves all of them on a shared minibatch, turning K small
+    # GEMMs into a few batched ones. Each member keeps its own seed, learning rate and SGD momentum
+    # buffer, so its per-epoch metrics match training it alone.
+    def __init__(self, members, layer1size=512, layer2size=512, momentum=0.0, device="cpu"):
+        # members: e.g. expand_grid(seed=[0, 1, 2], learning_rate=[1e-3, 1e-2])
+        self.members = [dict(member) for member in members]
+        models = []
+        for member in self.members:
+            torch.manual_seed(member.get("seed", 0))
+            models.append(NeuralNetwork(layer1size, layer2size).to(device))
+        self.layer1size, self.layer2size = layer1size, layer2size
+        self.params, self.buffers = stack_module_state(models)
+        self.base = copy.deepcopy(models[0]).to("meta")
+        self.momentum = momentum
+        self.momentum_buffers = {name: None for name in self.params}
+        self.learning_rates = torch.tensor([member["learning_rate"] for member in self.members], device=device)
+        self.forward = vmap(self._member_forward, in_dims=(0, 0, None))
+
+    def _member_forward(self, params, buffers, x):
+        return functional_call(self.base, (params, buffers), (x,))
+
+    def __len__(self):
+        return len(self.members)
+
+    def _step(self):
+        # Plain SGD (same update rule as torch.optim.SGD with dampening=0) with a per-member learning rate
+        with torch.no_grad():
+            for name, param in self.params.items():
+                update = param.grad
+                if self.momentum:
+                    buffer = self.momentum_buffers[name]
+                    if buffer is None:
+                        buffer = self.momentum_buffers[name] = update.clone()
+                    else:
+                        buffer.mul_(self.momentum).add_(update)
+                    update = buffer
+                param.sub_(self.learning_rates.view(-1, *[1] * (param.dim() - 1)) * update)
+                param.grad = None
+
+    def train(self, dataloader, loss_fn):
+        device = self.learning_rates.device
+        member_loss = vmap(loss_fn, in_dims=(0, None))
+        for X, y in dataloader:
+            X, y = X.to(device), y.to(device)
+            preds = self.forward(self.params, self.buffers, X)
+            # Members share no parameters, so the gradient of the summed loss is each member's own gradient
+            member_loss(preds, y).sum().backward()
+            self._step()
+
+    def test(self, dataloader, loss_fn):
+        # Per-member (accuracy, avg_loss), computed like test() and synchronized once per call
+        size = len(dataloader.dataset)
+        device = self.learning_rates.device
+        member_loss = vmap(loss_fn, in_dims=(0, None))
+        test_loss = torch.zeros(len(self), dtype=torch.float64, device=device)
+        correct = torch.zeros(len(self), dtype=torch.int64, device=device)
+        with torch.no_grad():
+            for X, y in dataloader:
+                X, y = X.to(device), y.to(device)
+                preds = self.forward(self.params, self.buffers, X)
+                test_loss += member_loss(preds, y)
+                correct += (preds.argmax(2) == y).sum(1)
+        return [(100 * c / size, l / size) for c, l in zip(correct.tolist(), test_loss.tolist())]
+
+    def fit(self, train_dataloader, test_dataloader, loss_fn, epochs, verbose=True):
+        history = [{**member, "accuracies": [], "avg_losses": []} for member in self.members]
+        for t in range(epochs):
+            self.train(train_dataloader, loss_fn)
+            for row, (accuracy, avg_loss) in zip(history, self.test(test_dataloader, loss_fn)):
+                row["accuracies"].append(accuracy)
+                row["avg_losses"].append(avg_loss)
+            if verbose:
+                print(f"Epoch {t+1}: " + ", ".join(f"{row['accuracies'][-1]:>0.1f}%" for row in history))
+        for row in history:
+            row["accuracy"], row["avg_loss"] = row["accuracies"][-1], row["avg_losses"][-1]
+        return history
+
+    def member(self, k):
+        # Unstack member k into an ordinary NeuralNetwork, e.g. to save or serve it
+        model = NeuralNetwork(self.layer1size, self.layer2size).to(self.learning_rates.device)
+        model.load_state_dict({name: param[k].detach().clone() for name, param in {**self.params, **self.buffers}.items()})
+        return model
@@ -0,0 +1,13 @@
+# Class names in label order. Kept free of imports so torch-less entry points (e.g. the predict CLI) can use them.
+classes = [
+    "T-shirt/top",
+    "Trouser",
+    "Pullover",
+    "Dress",
+    "Coat",
+    "Sandal",
+    "Shirt",
+    "Sneaker",
+    "Bag",
+    "Ankle boot",
+]
@@ -0,0 +1,108 @@
+import argparse
+import copy
+
+import torch
+from torch import nn
+
+from FashionMNISTData import BatchIterator, load_raw
+from FashionMNISTModel import NeuralNetwork, train, test
+from FashionMNISTPrune import latency, linear_flops, linear_layers, parameter_count
+
+
+def factorize_linear(layer, rank):
+    # W [out, in] ~= (U_r sqrt(S_r)) (sqrt(S_r) V_r^T): a thin in->rank layer followed by rank->out with the bias
+    U, S, Vh = torch.linalg.svd(layer.weight.detach().float(), full_matrices=False)
+    root = S[:rank].sqrt()
+    first = nn.Linear(layer.in_features, rank, bias=False, device=layer.weight.device)
+    second = nn.Linear(rank, layer.out_features, device=layer.weight.device)
+    with torch.no_grad():
+        first.weight.copy_(root[:, None] * Vh[:rank])
+        second.weight.copy_(U[:, :rank] * root[None, :])
+        second.bias.copy_(layer.bias.detach())
+    return nn.Sequential(first, second)
+
+
+def energy_rank(layer, energy=0.9):
+    # Smallest rank keeping `energy` of the squared singular value mass
+    S = torch.linalg.svdvals(layer.weight.detach().float())
+    kept = (S ** 2).cumsum(0) / (S ** 2).sum()
+    return int((kept < energy).sum().item()) + 1
+
+
+def worthwhile(layer, rank):
+    # Only factorize when the two thin layers are cheaper than the original
+    return rank * (layer.in_features + layer.out_features) < layer.in_features * layer.out_features
+
+
+def low_rank_model(model, ranks=None, energy=None):
+    # ranks: {index in linear_relu_stack: rank}; otherwise every layer's rank comes from the energy budget
+    model = copy.deepcopy(model)
+    for index, layer in linear_layers(model):
+        rank = ranks.get(index) if ranks is not None else energy_rank(layer, energy)
+        if rank is not None and worthwhile(layer, rank):
+            model.linear_relu_stack[index] = factorize_linear(layer, rank)
+    return model
+
+
+def accuracy_ranks(model, test_dataloader, loss_fn, budget=0.5):
+    # Per layer (others left intact), the smallest rank whose test() accuracy is within `budget`
+    # percentage points of the original model, found by bisection
+    baseline, _ = test(test_dataloader, model, loss_fn, verbose=False)
+    ranks = {}
+    for index, layer in linear_layers(model):
+        low, high = 1, min(layer.in_features, layer.out_features)
+        while low < high:
+            mid = (low + high) // 2
+            accuracy, _ = test(test_dataloader, low_rank_model(model, {index: mid}), loss_fn, verbose=False)
+            if baseline - accuracy <= budget:
+                high = mid
+            else:
+                low = mid + 1
+        ranks[index] = low
+    return ranks
+
+
+def rank_sweep(model, ranks, test_dataloader, loss_fn, train_dataloader=None, fine_tune_epochs=0, learning_rate=1e-3):
+    # Same rank applied to every layer where it pays off; optional short fine-tune of each factorized model
+    results = []
+    for rank in ranks:
+        compressed = low_rank_model(model, {index: rank for index, _ in linear_layers(model)})
+        accuracy, avg_loss = test(test_dataloader, compressed, loss_fn, verbose=False)
+        row = {"rank": rank, "params": parameter_count(compressed), "flops": linear_flops(compressed),
+               "latency_ms": latency(compressed), "accuracy": accuracy, "avg_loss": avg_loss}
+        if train_dataloader is not None and fine_tune_epochs:
+            optimizer = torch.optim.SGD(compressed.parameters(), lr=learning_rate)
+            for t in range(fine_tune_epochs):
+                train(train_dataloader, compressed, loss_fn, optimizer, verbose=False)
+            row["tuned_accuracy"], row["tuned_avg_loss"] = test(test_dataloader, compressed, loss_fn, verbose=False)
+        results.append(row)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Truncated-SVD compression of the trained MLP")
+    parser.add_argument("--model", default="data/model.pth")
+    parser.add_argument("--root", default="data")
+    parser.add_argument("--ranks", type=int, nargs="+", default=[8, 16, 32, 64, 128, 256])
+    parser.add_argument("--energy", type=float, default=0.9)
+    parser.add_argument("--fine-tune-epochs", type=int, default=0)
+    args = parser.parse_args()
+
+    model = NeuralNetwork()
+    model.load_state_dict(torch.load(args.model, map_location="cpu"))
+    loss_fn = nn.CrossEntropyLoss()
+    test_dataloader = BatchIterator(load_raw(root=args.root, train=False), batch_size=256)
+    train_dataloader = BatchIterator(load_raw(root=args.root, train=True), batch_size=64, shuffle=True) if args.fine_tune_epochs else None
+
+    baseline = {"rank": "full", "params": parameter_count(model), "flops": linear_flops(model), "latency_ms": latency(model)}
+    baseline["accuracy"], baseline["avg_loss"] = test(test_dataloader, model, loss_fn, verbose=False)
+    by_energy = low_rank_model(model, energy=args.energy)
+    energy_row = {"rank": f"{args.energy:.0%} energy", "params": parameter_count(by_energy),
+                  "flops": linear_flops(by_energy), "latency_ms": latency(by_energy)}
+    energy_row["accuracy"], energy_row["avg_loss"] = test(test_dataloader, by_energy, loss_fn, verbose=False)
+    rows = [baseline, energy_row] + rank_sweep(model, args.ranks, test_dataloader, loss_fn, train_dataloader, args.fine_tune_epochs)
+
+    print(f"{'rank':>12}{'params':>10}{'MFLOPs':>9}{'ms/256':>9}{'accuracy':>10}{'tuned':>8}")
+    for row in rows:
+        tuned = f"{row['tuned_accuracy']:>7.1f}%" if "tuned_accuracy" in row else f"{'':>8}"
+        print(f"{row['rank']:>12}{row['params']:>10d}{row['flops'] / 1e6:>9.2f}{row['latency_ms']:>9.3f}{row['accuracy']:>9.1f}%{tuned}")
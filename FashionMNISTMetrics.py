@@ -0,0 +1,148 @@
+import multiprocessing
+import os
+import queue
+import threading
+
+import numpy as np
+
+
+class ArrayBuffer:
+    # Preallocated 1-D history; append is O(1) (capacity doubles if ever exceeded) and .values is a view
+    def __init__(self, capacity=1024, dtype=np.float64):
+        self.data = np.empty(capacity, dtype=dtype)
+        self.size = 0
+
+    def append(self, value):
+        if self.size == len(self.data):
+            self.data = np.concatenate([self.data, np.empty_like(self.data)])
+        self.data[self.size] = value
+        self.size += 1
+
+    @property
+    def values(self):
+        return self.data[:self.size]
+
+    def __len__(self):
+        return self.size
+
+
+class RingBuffer(ArrayBuffer):
+    # Keeps only the last `capacity` values; .values returns them oldest first
+    def append(self, value):
+        self.data[self.size % len(self.data)] = value
+        self.size += 1
+
+    @property
+    def values(self):
+        if self.size <= len(self.data):
+            return self.data[:self.size]
+        start = self.size % len(self.data)
+        return np.concatenate([self.data[start:], self.data[:start]])
+
+    def __len__(self):
+        return min(self.size, len(self.data))
+
+
+class PolynomialFit:
+    # Incremental least squares: keeps the running sums of x^k and x^k * y, so each update is O(degree)
+    # and the fit never revisits the history. coefficients() is ordered like np.polyfit (highest power first).
+    def __init__(self, degree=2):
+        self.degree = degree
+        self.powers = np.zeros(2 * degree + 1)
+        self.moments = np.zeros(degree + 1)
+
+    def update(self, x, y):
+        x_powers = float(x) ** np.arange(2 * self.degree + 1)
+        self.powers += x_powers
+        self.moments += x_powers[:self.degree + 1] * float(y)
+
+    def coefficients(self):
+        n = self.degree + 1
+        normal = np.array([[self.powers[i + j] for j in range(n)] for i in range(n)])
+        # lstsq rather than solve so fewer points than coefficients still gives an answer
+        solution = np.linalg.lstsq(normal, self.moments, rcond=None)[0]
+        return solution[::-1]
+
+
+def _render(snapshot, directory):
+    # Figure objects straight from matplotlib.figure, not pyplot, so rendering on a thread leaves the
+    # caller's backend and current figure alone
+    from matplotlib.figure import Figure
+
+    epoch = snapshot["epoch"]
+    accuracies, variations, p = snapshot["accuracies"], snapshot["variations"], snapshot["fit"]
+    fig = Figure()
+    ax = fig.subplots()
+    ax.scatter(accuracies, variations, s=8)
+    xs = np.linspace(accuracies.min(), accuracies.max(), 100)
+    ax.plot(xs, np.polyval(p, xs), color="salmon")
+    ax.set_xlabel("Accuracy")
+    ax.set_ylabel("Std of contributions")
+    fig.savefig(os.path.join(directory, f"variation_{epoch:05d}.png"))
+
+    contributions = snapshot["contributions"]
+    fig = Figure()
+    ax = fig.subplots()
+    ax.hist(np.concatenate(contributions), color="lightgreen", ec="black")
+    fig.savefig(os.path.join(directory, f"histogram_{epoch:05d}.png"))
+
+    # Every neuron as one point of a single scatter, coloured blue -> red by its share of the layer maximum
+    xs = np.concatenate([np.full(len(layer), i) for i, layer in enumerate(contributions)])
+    ys = np.concatenate([np.arange(len(layer)) for layer in contributions])
+    strengths = np.concatenate([layer / layer.max() if layer.max() > 0 else layer for layer in contributions])
+    colors = np.stack([strengths, np.zeros_like(strengths), 1 - strengths], axis=1).clip(0, 1)
+    fig = Figure(figsize=(2 + len(contributions), 8))
+    ax = fig.subplots()
+    ax.scatter(xs, ys, c=colors, s=4, marker="s")
+    ax.set_xticks(range(len(contributions)))
+    ax.set_xlabel("Layer")
+    ax.set_ylabel("Neuron")
+    fig.savefig(os.path.join(directory, f"neurons_{epoch:05d}.png"))
+
+
+def _plot_worker(tasks, directory):
+    stopping = False
+    while not stopping:
+        snapshot = tasks.get()
+        if snapshot is None:
+            return
+        # Skip straight to the newest snapshot if the renderer has fallen behind
+        while True:
+            try:
+                newer = tasks.get_nowait()
+            except queue.Empty:
+                break
+            if newer is None:
+                stopping = True
+                break
+            snapshot = newer
+        _render(snapshot, directory)
+
+
+class PlotWorker:
+    # Renders the analysis charts to PNGs in a separate process so training never waits on matplotlib.
+    # submit() only enqueues; if rendering falls behind, stale snapshots are skipped, never the latest.
+    # The process is spawned, which re-imports the calling script: scripts without an
+    # `if __name__ == "__main__":` guard should pass process=False to render on a background thread instead.
+    def __init__(self, directory="data/plots", every=10, process=True):
+        os.makedirs(directory, exist_ok=True)
+        self.every = every
+        if process:
+            context = multiprocessing.get_context("spawn")
+            self.tasks = context.Queue()
+            self.process = context.Process(target=_plot_worker, args=(self.tasks, directory), daemon=True)
+        else:
+            self.tasks = queue.Queue()
+            self.process = threading.Thread(target=_plot_worker, args=(self.tasks, directory), daemon=True)
+        self.process.start()
+
+    def submit(self, epoch, accuracies, variations, fit, contributions, force=False):
+        if not force and epoch % self.every:
+            return False
+        self.tasks.put({"epoch": epoch, "accuracies": np.array(accuracies), "variations": np.array(variations),
+                        "fit": np.array(fit), "contributions": [np.asarray(layer) for layer in contributions]})
+        return True
+
+    def close(self):
+        self.tasks.put(None)
+        self.process.join()
@@ -0,0 +1,137 @@
+import torch
+from torch import nn
+
+from FashionMNISTInstrument import DISABLED
+from FashionMNISTLabels import classes
+
+
+# Define model (defaults give the 784-512-512-10 network from FashionMNISTClassifier.py)
+class NeuralNetwork(nn.Module):
+    def __init__(self, layer1size=512, layer2size=512):
+        super(NeuralNetwork, self).__init__()
+        self.flatten = nn.Flatten()
+        self.layer1size, self.layer2size = layer1size, layer2size
+        self.linear_relu_stack = nn.Sequential(
+            nn.Linear(28*28, layer1size),
+            nn.ReLU(),
+            nn.Linear(layer1size, layer2size),
+            nn.ReLU(),
+            nn.Linear(layer2size, 10),
+            nn.ReLU()
+        )
+
+    def forward(self, x):
+        x = self.flatten(x)
+        logits = self.linear_relu_stack(x)
+        return logits
+
+
+# The deeper 784-512-512-512-512-10 network FashionMNISTAnalysis.py tracks neuron contributions on. Module
+# names match its NeuralNetwork, so state_dicts load into either.
+class AnalysisNetwork(nn.Module):
+    def __init__(self, width=512, hidden_layers=4):
+        super(AnalysisNetwork, self).__init__()
+        self.flatten = nn.Flatten()
+        layers = [nn.Linear(28*28, width), nn.ReLU()]
+        for _ in range(hidden_layers - 1):
+            layers += [nn.Linear(width, width), nn.ReLU()]
+        self.linear_relu_stack = nn.Sequential(*layers, nn.Linear(width, 10), nn.ReLU())
+
+    def forward(self, x):
+        x = self.flatten(x)
+        logits = self.linear_relu_stack(x)
+        return logits
+
+
+def model_device(model):
+    # Quantized modules keep packed weights instead of parameters, so fall back to cpu
+    for tensor in model.parameters():
+        return tensor.device
+    return torch.device("cpu")
+
+
+def train(dataloader, model, loss_fn, optimizer, verbose=True, bf16=False, instrument=DISABLED, augment=None):
+    # bf16=True runs forward and loss under bfloat16 autocast; weights and optimizer.step() stay fp32
+    # instrument: an Instrument to time the data/h2d/forward/loss/backward/step phases of each batch
+    # augment: a batch -> batch callable (e.g. BatchAugment) applied on-device right before the forward pass
+    size = len(dataloader.dataset)
+    device = model_device(model)
+    model.train()
+    for batch, (X, y) in enumerate(instrument.timed(dataloader)):
+        with instrument.phase("h2d"):
+            X, y = X.to(device), y.to(device)
+        if augment is not None:
+            with instrument.phase("augment"):
+                X = augment(X)
+
+        # Compute prediction error
+        with torch.autocast(device.type, dtype=torch.bfloat16, enabled=bf16):
+            with instrument.phase("forward"):
+                pred = model(X)
+            with instrument.phase("loss"):
+                loss = loss_fn(pred, y)
+
+        # Backpropagation
+        with instrument.phase("backward"):
+            optimizer.zero_grad()
+            loss.backward()
+        with instrument.phase("step"):
+            optimizer.step()
+        instrument.step(len(y))
+
+        if verbose and batch % 100 == 0:
+            loss, current = loss.item(), batch * len(X)
+            print(f"loss: {loss:>7f}  [{current:>5d}/{size:>5d}]")
+
+
+def evaluate_detailed(dataloader, models, loss_fn, topk=(5,), bf16=False):
+    # Scores every model on each batch while it is hot in cache. Loss, accuracy, top-k hits and the
+    # confusion matrix accumulate in on-device tensors and are synchronized once at the end.
+    size = len(dataloader.dataset)
+    devices = [model_device(model) for model in models]
+    totals = []
+    for device in devices:
+        float_dtype = torch.float32 if device.type == "mps" else torch.float64
+        totals.append({"loss": torch.zeros((), dtype=float_dtype, device=device),
+                       "correct": torch.zeros((), dtype=torch.int64, device=device),
+                       "topk": torch.zeros(len(topk), dtype=torch.int64, device=device),
+                       "confusion": torch.zeros(10 * 10, dtype=torch.int64, device=device)})
+    for model in models:
+        model.eval()
+    with torch.no_grad():
+        for X, y in dataloader:
+            batches = {}
+            for model, device, total in zip(models, devices, totals):
+                if device not in batches:
+                    batches[device] = X.to(device), y.to(device)
+                X_d, y_d = batches[device]
+                with torch.autocast(device.type, dtype=torch.bfloat16, enabled=bf16):
+                    pred = model(X_d)
+                total["loss"] += loss_fn(pred.float(), y_d)
+                predicted = pred.argmax(1)
+                total["correct"] += (predicted == y_d).sum()
+                total["confusion"] += torch.bincount(y_d * 10 + predicted, minlength=10 * 10)
+                ranked = pred.topk(max(topk), dim=1).indices
+                for i, k in enumerate(topk):
+                    total["topk"][i] += (ranked[:, :k] == y_d[:, None]).any(1).sum()
+    results = []
+    for total in totals:
+        host = {name: value.cpu() for name, value in total.items()}
+        result = {"accuracy": 100 * host["correct"].item() / size, "avg_loss": host["loss"].item() / size,
+                  "confusion": host["confusion"].reshape(10, 10).numpy()}
+        for k, hits in zip(topk, host["topk"].tolist()):
+            result[f"top{k}"] = 100 * hits / size
+        results.append(result)
+    return results
+
+
+def evaluate_many(dataloader, models, loss_fn, bf16=False):
+    # Same (accuracy, avg_loss) tuples test() returns, for every model, in one pass over the data
+    return [(result["accuracy"], result["avg_loss"]) for result in evaluate_detailed(dataloader, models, loss_fn, bf16=bf16)]
+
+
+def test(dataloader, model, loss_fn, verbose=True, bf16=False):
+    accuracy, test_loss = evaluate_many(dataloader, [model], loss_fn, bf16=bf16)[0]
+    if verbose:
+        print(f"Test Error: \n Accuracy: {accuracy:>0.1f}%, Avg loss: {test_loss:>8f} \n")
+    return accuracy, test_loss # accuracy and avg loss
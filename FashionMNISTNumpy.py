@@ -0,0 +1,136 @@
+import argparse
+import sys
+import time
+
+import numpy as np
+
+# Kept free of torch at import time: serving workers only need numpy and the exported .npz.
+# torch is imported lazily by export_npz() and by the parity/latency checks.
+
+
+def export_npz(model_path="data/model.pth", npz_path="data/model.npz"):
+    import torch
+    state = torch.load(model_path, map_location="cpu")
+    # linear_relu_stack.{0,2,4}.weight/bias, in layer order
+    layers = sorted({key.rsplit(".", 1)[0] for key in state if key.endswith(".weight")},
+                    key=lambda name: [int(part) if part.isdigit() else part for part in name.split(".")])
+    arrays = {}
+    for i, layer in enumerate(layers):
+        # Stored as [in, out] so the forward pass is a plain x @ W with no transpose
+        arrays[f"w{i}"] = np.ascontiguousarray(state[f"{layer}.weight"].float().numpy().T)
+        arrays[f"b{i}"] = np.ascontiguousarray(state[f"{layer}.bias"].float().numpy())
+    np.savez(npz_path, **arrays)
+    return npz_path
+
+
+class NumpyMLP:
+    # Linear + ReLU stack (ReLU after every layer, like NeuralNetwork) evaluated with preallocated
+    # activation buffers; buffers grow to the largest batch seen and smaller batches use views into them.
+    def __init__(self, npz_path="data/model.npz"):
+        with np.load(npz_path) as arrays:
+            count = len([name for name in arrays.files if name.startswith("w")])
+            self.weights = [np.ascontiguousarray(arrays[f"w{i}"], dtype=np.float32) for i in range(count)]
+            self.biases = [np.ascontiguousarray(arrays[f"b{i}"], dtype=np.float32) for i in range(count)]
+        self.capacity = 0
+        self.input = None
+        self.activations = []
+
+    def _reserve(self, n):
+        if n > self.capacity:
+            self.capacity = n
+            self.input = np.empty((n, self.weights[0].shape[0]), dtype=np.float32)
+            self.activations = [np.empty((n, w.shape[1]), dtype=np.float32) for w in self.weights]
+
+    def forward(self, x):
+        # x: uint8 pixels or float32 in [0, 1], shaped [N, 28, 28], [N, 1, 28, 28] or [N, 784].
+        # Returns a view into an internal buffer that is overwritten by the next call.
+        x = np.asarray(x)
+        n = x.shape[0] if x.ndim > 1 else 1
+        x = x.reshape(n, -1)
+        self._reserve(n)
+        if x.dtype == np.float32 and x.flags.c_contiguous:
+            h = x
+        else:
+            h = self.input[:n]
+            if x.dtype == np.uint8:
+                np.multiply(x, np.float32(1 / 255), out=h)
+            else:
+                h[...] = x
+        for w, b, buffer in zip(self.weights, self.biases, self.activations):
+            out = buffer[:n]
+            np.matmul(h, w, out=out)
+            out += b
+            np.maximum(out, 0, out=out)
+            h = out
+        return h
+
+    def predict(self, x):
+        return self.forward(x).argmax(1)
+
+
+def check_parity(model_path="data/model.pth", npz_path="data/model.npz", images=None, atol=1e-4):
+    import torch
+    from FashionMNISTModel import NeuralNetwork
+    model = NeuralNetwork()
+    model.load_state_dict(torch.load(model_path, map_location="cpu"))
+    model.eval()
+    engine = NumpyMLP(npz_path)
+    if images is None:
+        images = np.random.default_rng(0).integers(0, 256, size=(512, 28, 28), dtype=np.uint8)
+    for batch_size in (1, 7, 64, len(images)):
+        batch = images[:batch_size]
+        with torch.no_grad():
+            expected = model(torch.from_numpy(np.asarray(batch, dtype=np.float32) / 255)).numpy()
+        actual = engine.forward(batch)
+        error = float(np.abs(expected - actual).max())
+        if error > atol:
+            raise AssertionError(f"numpy engine disagrees with torch at batch size {batch_size}: max abs error {error:.3g}")
+    return True
+
+
+def compare_latency(model_path="data/model.pth", npz_path="data/model.npz", batch_sizes=(1, 16, 256, 4096), repeats=50):
+    import torch
+    from FashionMNISTModel import NeuralNetwork
+    model = NeuralNetwork()
+    model.load_state_dict(torch.load(model_path, map_location="cpu"))
+    model.eval()
+    engine = NumpyMLP(npz_path)
+    rng = np.random.default_rng(0)
+    print(f"{'batch':>6}  {'torch ms':>9}  {'numpy ms':>9}  {'speedup':>7}")
+    report = []
+    for batch_size in batch_sizes:
+        images = rng.integers(0, 256, size=(batch_size, 28, 28), dtype=np.uint8)
+
+        def run_torch():
+            with torch.no_grad():
+                model(torch.from_numpy(images).to(torch.float32).div_(255))
+
+        timings = {}
+        for name, fn in (("torch", run_torch), ("numpy", lambda: engine.forward(images))):
+            fn()
+            start = time.perf_counter()
+            for _ in range(repeats):
+                fn()
+            timings[name] = (time.perf_counter() - start) / repeats * 1000
+        print(f"{batch_size:>6d}  {timings['torch']:>9.3f}  {timings['numpy']:>9.3f}  {timings['torch'] / timings['numpy']:>6.2f}x")
+        report.append({"batch_size": batch_size, "torch_ms": timings["torch"], "numpy_ms": timings["numpy"]})
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export and run the trained MLP without torch")
+    parser.add_argument("command", choices=["export", "check", "bench"])
+    parser.add_argument("--model", default="data/model.pth")
+    parser.add_argument("--npz", default="data/model.npz")
+    args = parser.parse_args()
+    if args.command == "export":
+        print(f"Wrote {export_npz(args.model, args.npz)}")
+    elif args.command == "check":
+        try:
+            check_parity(args.model, args.npz)
+        except AssertionError as error:
+            print(error)
+            sys.exit(1)
+        print("numpy engine matches torch")
+    else:
+        compare_latency(args.model, args.npz)
@@ -0,0 +1,65 @@
+import argparse
+import multiprocessing
+import resource
+import time
+
+import torch
+from torch import nn
+
+from FashionMNISTData import BatchIterator, load_raw
+from FashionMNISTModel import NeuralNetwork, train, test
+
+
+def load_bf16(path="data/model.pth"):
+    # bf16 inference path: the fp32 checkpoint with its weights cast to bfloat16
+    model = NeuralNetwork()
+    model.load_state_dict(torch.load(path, map_location="cpu"))
+    return model.to(torch.bfloat16).eval()
+
+
+def predict_bf16(model, x):
+    with torch.no_grad():
+        return model(x.to(torch.bfloat16)).float()
+
+
+def _run(bf16, epochs, batch_size, learning_rate, root, seed):
+    # One precision per fresh process so peak RSS belongs to that mode alone
+    torch.manual_seed(seed)
+    train_dataloader = BatchIterator(load_raw(root=root, train=True), batch_size=batch_size)
+    test_dataloader = BatchIterator(load_raw(root=root, train=False), batch_size=batch_size)
+    model = NeuralNetwork()
+    loss_fn = nn.CrossEntropyLoss()
+    optimizer = torch.optim.SGD(model.parameters(), lr=learning_rate)
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    epoch_seconds = []
+    for t in range(epochs):
+        start = time.perf_counter()
+        train(train_dataloader, model, loss_fn, optimizer, verbose=False, bf16=bf16)
+        epoch_seconds.append(time.perf_counter() - start)
+    accuracy, avg_loss = test(test_dataloader, model, loss_fn, verbose=False, bf16=bf16)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {"mode": "bf16" if bf16 else "fp32", "epoch_s": sum(epoch_seconds) / epochs, "accuracy": accuracy,
+            "avg_loss": avg_loss, "peak_rss_mb": peak / 1024, "training_rss_mb": (peak - before) / 1024}
+
+
+def compare(epochs=3, batch_size=64, learning_rate=1e-3, root="data", seed=0):
+    if not torch.backends.mkldnn.is_available():
+        print("warning: this torch build has no oneDNN; bf16 matmuls will be emulated and slow")
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(1, maxtasksperchild=1) as pool:
+        rows = [pool.apply(_run, (bf16, epochs, batch_size, learning_rate, root, seed)) for bf16 in (False, True)]
+    print(f"{'mode':>5}{'epoch s':>10}{'accuracy':>10}{'avg loss':>11}{'peak RSS MB':>13}{'training MB':>13}")
+    for row in rows:
+        print(f"{row['mode']:>5}{row['epoch_s']:>10.2f}{row['accuracy']:>9.1f}%{row['avg_loss']:>11.6f}"
+              f"{row['peak_rss_mb']:>13.0f}{row['training_rss_mb']:>13.0f}")
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare fp32 with bfloat16 autocast training and inference")
+    parser.add_argument("--epochs", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--learning-rate", type=float, default=1e-3)
+    parser.add_argument("--root", default="data")
+    args = parser.parse_args()
+    compare(args.epochs, args.batch_size, args.learning_rate, args.root)
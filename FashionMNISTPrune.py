@@ -0,0 +1,101 @@
+import copy
+import math
+import time
+
+import torch
+from torch import nn
+
+from FashionMNISTModel import model_device, train, test
+
+
+def linear_layers(model):
+    # (index in linear_relu_stack, module) for every Linear, input to output
+    return [(i, layer) for i, layer in enumerate(model.linear_relu_stack) if isinstance(layer, nn.Linear)]
+
+
+def gradient_contributions(dataloader, model, loss_fn):
+    # Same per-neuron score as test_loop in FashionMNISTAnalysis.py (|dW| summed over inputs plus |db|),
+    # taken from the gradients directly so it works without an SGD momentum buffer
+    layers = [layer for _, layer in linear_layers(model)][:-1]
+    contributions = [torch.zeros(layer.out_features, device=layer.weight.device) for layer in layers]
+    device = model_device(model)
+    model.eval()
+    for X, y in dataloader:
+        X, y = X.to(device), y.to(device)
+        model.zero_grad()
+        loss_fn(model(X), y).backward()
+        with torch.no_grad():
+            for total, layer in zip(contributions, layers):
+                total += layer.weight.grad.abs().sum(1) + layer.bias.grad.abs()
+    model.zero_grad()
+    return [total.cpu().numpy() for total in contributions]
+
+
+def prune_model(model, contributions, ratio):
+    # Drops the `ratio` lowest-contribution neurons of every hidden layer and rebuilds physically smaller
+    # Linear layers: rows of the layer's own weight/bias and the matching columns of the next layer.
+    model = copy.deepcopy(model)
+    layers = linear_layers(model)
+    keep_in = None
+    for n, (index, layer) in enumerate(layers):
+        weight, bias = layer.weight.detach(), layer.bias.detach()
+        if keep_in is not None:
+            weight = weight[:, keep_in]
+        keep_out = None
+        if n < len(layers) - 1:
+            scores = torch.as_tensor(contributions[n], dtype=torch.float32, device=weight.device)
+            count = max(1, math.ceil(layer.out_features * (1 - ratio)))
+            keep_out = scores.topk(count).indices.sort().values
+            weight, bias = weight[keep_out], bias[keep_out]
+        pruned = nn.Linear(weight.shape[1], weight.shape[0], device=weight.device)
+        with torch.no_grad():
+            pruned.weight.copy_(weight)
+            pruned.bias.copy_(bias)
+        model.linear_relu_stack[index] = pruned
+        keep_in = keep_out
+    sizes = [layer.out_features for _, layer in linear_layers(model)][:-1]
+    if len(sizes) == 2 and hasattr(model, "layer1size"):
+        model.layer1size, model.layer2size = sizes
+    return model
+
+
+def linear_flops(model):
+    # Multiply-adds counted as 2 FLOPs, per sample; includes Linear layers nested in factorized blocks
+    return sum(2 * layer.in_features * layer.out_features for layer in model.modules() if isinstance(layer, nn.Linear))
+
+
+def parameter_count(model):
+    return sum(p.numel() for p in model.parameters())
+
+
+def latency(model, batch_size=256, repeats=50):
+    x = torch.rand(batch_size, 1, 28, 28, device=model_device(model))
+    model.eval()
+    with torch.no_grad():
+        for _ in range(5):
+            model(x)
+        start = time.perf_counter()
+        for _ in range(repeats):
+            model(x)
+    return (time.perf_counter() - start) / repeats * 1000
+
+
+def prune_sweep(model, contributions, ratios, test_dataloader, loss_fn, train_dataloader=None,
+                fine_tune_epochs=0, learning_rate=1e-3, momentum=0.5):
+    results = []
+    for ratio in ratios:
+        pruned = prune_model(model, contributions, ratio)
+        accuracy, avg_loss = test(test_dataloader, pruned, loss_fn, verbose=False)
+        row = {"ratio": ratio, "hidden": [layer.out_features for _, layer in linear_layers(pruned)][:-1],
+               "params": parameter_count(pruned), "flops": linear_flops(pruned), "latency_ms": latency(pruned),
+               "accuracy": accuracy, "avg_loss": avg_loss}
+        if train_dataloader is not None and fine_tune_epochs:
+            optimizer = torch.optim.SGD(pruned.parameters(), lr=learning_rate, momentum=momentum)
+            for t in range(fine_tune_epochs):
+                train(train_dataloader, pruned, loss_fn, optimizer, verbose=False)
+            row["tuned_accuracy"], row["tuned_avg_loss"] = test(test_dataloader, pruned, loss_fn, verbose=False)
+        print(f"prune {100*ratio:>4.0f}%: hidden {row['hidden']}, {row['flops']/1e6:>6.2f} MFLOPs, "
+              f"{row['latency_ms']:>7.3f} ms/256, accuracy {accuracy:>0.1f}%"
+              + (f" -> {row['tuned_accuracy']:>0.1f}% after fine-tuning" if "tuned_accuracy" in row else ""))
+        results.append(row)
+    return results
@@ -0,0 +1,72 @@
+import argparse
+import io
+import time
+import warnings
+
+import torch
+from torch import nn
+
+from FashionMNISTData import BatchIterator, load_raw
+from FashionMNISTModel import NeuralNetwork, test
+
+
+def quantize(model):
+    # Dynamic int8: Linear weights are stored as qint8, activations are quantized on the fly per batch.
+    # Recent torch releases warn that this eager API is moving to torchao; it still works, so keep the output quiet.
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        return torch.ao.quantization.quantize_dynamic(model.cpu().eval(), {nn.Linear}, dtype=torch.qint8)
+
+
+def load_quantized(path="data/model.pth", layer1size=512, layer2size=512):
+    # Built from the same fp32 state_dict checkpoint the other scripts save
+    model = NeuralNetwork(layer1size, layer2size)
+    model.load_state_dict(torch.load(path, map_location="cpu"))
+    return quantize(model)
+
+
+def model_size(model):
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.getbuffer().nbytes
+
+
+def latency(model, batch_size, repeats=100):
+    x = torch.rand(batch_size, 1, 28, 28)
+    with torch.no_grad():
+        for _ in range(5):
+            model(x)
+        start = time.perf_counter()
+        for _ in range(repeats):
+            model(x)
+    return (time.perf_counter() - start) / repeats * 1000
+
+
+def compare(path="data/model.pth", root="data", batch_size=64):
+    fp32 = NeuralNetwork()
+    fp32.load_state_dict(torch.load(path, map_location="cpu"))
+    fp32.eval()
+    int8 = load_quantized(path)
+    test_dataloader = BatchIterator(load_raw(root=root, train=False), batch_size=batch_size)
+    loss_fn = nn.CrossEntropyLoss()
+
+    report = {}
+    for name, model in (("fp32", fp32), ("int8", int8)):
+        accuracy, avg_loss = test(test_dataloader, model, loss_fn, verbose=False)
+        report[name] = {"accuracy": accuracy, "avg_loss": avg_loss, "bytes": model_size(model),
+                        "batch1_ms": latency(model, 1), "batch256_ms": latency(model, 256, repeats=20)}
+    print(f"{'':6}{'accuracy':>10}{'avg loss':>11}{'size KiB':>10}{'batch-1 ms':>12}{'batch-256 ms':>14}")
+    for name, row in report.items():
+        print(f"{name:6}{row['accuracy']:>9.2f}%{row['avg_loss']:>11.6f}{row['bytes'] / 1024:>10.0f}"
+              f"{row['batch1_ms']:>12.3f}{row['batch256_ms']:>14.3f}")
+    print(f"accuracy delta (int8 - fp32): {report['int8']['accuracy'] - report['fp32']['accuracy']:+.2f} points, "
+          f"size {report['fp32']['bytes'] / report['int8']['bytes']:.1f}x smaller")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the fp32 model with its dynamic int8 quantization")
+    parser.add_argument("--model", default="data/model.pth")
+    parser.add_argument("--root", default="data")
+    args = parser.parse_args()
+    compare(args.model, args.root)
@@ -0,0 +1,93 @@
+import hashlib
+import io
+import json
+import sqlite3
+import time
+
+import torch
+
+
+def trial_key(config, seed=0, architecture="NeuralNetwork", patience=None):
+    # Stable hash of the architecture, hyperparameters, seed and early-stopping patience. The epoch count is
+    # deliberately left out so a longer run of the same trial resumes from the shorter one instead of starting
+    # over; patience is in because a trial it stopped early is only "finished" under that same policy.
+    identity = {"architecture": architecture, "config": config, "seed": seed}
+    if patience is not None:
+        # Only added when set, so keys of trials run without early stopping stay as they were
+        identity["patience"] = patience
+    payload = json.dumps(identity, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+class ResultStore:
+    # SQLite store of sweep trials: one row per trial, its per-epoch metrics and the latest
+    # model/optimizer state, so completed trials are skipped and interrupted ones resume.
+    def __init__(self, path="data/trials.sqlite"):
+        self.path = path
+        # Sweep workers write from separate processes; wait on the lock instead of failing
+        self.connection = sqlite3.connect(path, timeout=60)
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS trials (
+                key TEXT PRIMARY KEY, config TEXT, seed INTEGER, target_epochs INTEGER,
+                epochs INTEGER, accuracy REAL, avg_loss REAL, seconds REAL, status TEXT, updated REAL);
+            CREATE TABLE IF NOT EXISTS epochs (
+                key TEXT, epoch INTEGER, accuracy REAL, avg_loss REAL, PRIMARY KEY (key, epoch));
+            CREATE TABLE IF NOT EXISTS states (key TEXT PRIMARY KEY, epoch INTEGER, state BLOB);
+        """)
+
+    def close(self):
+        self.connection.close()
+
+    def start(self, key, config, seed, target_epochs):
+        with self.connection:
+            self.connection.execute(
+                "INSERT INTO trials (key, config, seed, target_epochs, epochs, seconds, status, updated) "
+                "VALUES (?, ?, ?, ?, 0, 0, 'running', ?) ON CONFLICT(key) DO UPDATE SET "
+                "target_epochs = MAX(target_epochs, excluded.target_epochs), status = 'running', updated = excluded.updated",
+                (key, json.dumps(config, sort_keys=True), seed, target_epochs, time.time()))
+
+    def record_epoch(self, key, epoch, accuracy, avg_loss, seconds, state=None):
+        # One transaction per epoch so an interrupted trial never leaves metrics and state out of step
+        with self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO epochs VALUES (?, ?, ?, ?)", (key, epoch, accuracy, avg_loss))
+            self.connection.execute(
+                "UPDATE trials SET epochs = ?, accuracy = ?, avg_loss = ?, seconds = ?, updated = ?, "
+                "status = CASE WHEN ? >= target_epochs THEN 'complete' ELSE 'running' END WHERE key = ?",
+                (epoch, accuracy, avg_loss, seconds, time.time(), epoch, key))
+            if state is not None:
+                buffer = io.BytesIO()
+                torch.save(state, buffer)
+                self.connection.execute("INSERT OR REPLACE INTO states VALUES (?, ?, ?)", (key, epoch, buffer.getvalue()))
+
+    def finish(self, key, status="complete"):
+        with self.connection:
+            self.connection.execute("UPDATE trials SET status = ?, updated = ? WHERE key = ?", (status, time.time(), key))
+
+    def load_state(self, key):
+        row = self.connection.execute("SELECT state FROM states WHERE key = ?", (key,)).fetchone()
+        return None if row is None else torch.load(io.BytesIO(row[0]), weights_only=False)
+
+    def history(self, key):
+        rows = self.connection.execute("SELECT accuracy, avg_loss FROM epochs WHERE key = ? ORDER BY epoch", (key,)).fetchall()
+        return [row[0] for row in rows], [row[1] for row in rows]
+
+    def get(self, key):
+        rows = self.query(key=key)
+        return rows[0] if rows else None
+
+    def query(self, status=None, key=None, **config_filters):
+        # e.g. store.query(status="complete", layer1size=512) -> rows shaped like run_trial() results
+        sql, params = "SELECT key, config, seed, epochs, accuracy, avg_loss, seconds, status FROM trials WHERE 1 = 1", []
+        if status is not None:
+            sql, params = sql + " AND status = ?", params + [status]
+        if key is not None:
+            sql, params = sql + " AND key = ?", params + [key]
+        for name, value in config_filters.items():
+            sql, params = sql + " AND json_extract(config, ?) = ?", params + [f"$.{name}", value]
+        results = []
+        for key, config, seed, epochs, accuracy, avg_loss, seconds, status in self.connection.execute(sql, params).fetchall():
+            accuracies, avg_losses = self.history(key)
+            results.append({**json.loads(config), "key": key, "seed": seed, "epochs": epochs, "accuracy": accuracy,
+                            "avg_loss": avg_loss, "accuracies": accuracies, "avg_losses": avg_losses,
+                            "seconds": seconds, "status": status})
+        return results
@@ -0,0 +1,223 @@
+import argparse
+import asyncio
+import json
+import time
+
+import numpy as np
+import torch
+
+from FashionMNISTModel import NeuralNetwork, classes
+
+
+def load_model(path="data/model.pth", device="cpu"):
+    model = NeuralNetwork().to(device)
+    model.load_state_dict(torch.load(path, map_location=device))
+    model.eval()
+    return model
+
+
+def to_input(image):
+    # Accepts integer pixels (0-255, any integer dtype, e.g. a JSON list of ints) or floats already in [0, 1],
+    # as [28, 28], [1, 28, 28] or 784 values
+    image = torch.as_tensor(np.asarray(image))
+    if not image.is_floating_point():
+        image = image.to(torch.float32).div_(255)
+    return image.to(torch.float32).reshape(1, 28, 28)
+
+
+def _result(row):
+    index = int(row.argmax())
+    return {"label": classes[index], "probability": float(row[index]), "probabilities": dict(zip(classes, row.tolist()))}
+
+
+class BatchingPredictor:
+    # Queues single-image requests and coalesces them into one model call per batch, bounded by
+    # max_batch_size and by how long the oldest request may wait (max_wait seconds).
+    # With a PredictionCache, repeated images are answered without queueing and only misses reach the model;
+    # when the cache sees the checkpoint change, the model is reloaded from it.
+    def __init__(self, model, max_batch_size=64, max_wait=0.002, cache=None):
+        self.model = model
+        self.cache = cache
+        self.device = next(model.parameters()).device
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.queue = None
+        self.worker = None
+        self.batches, self.requests = 0, 0
+
+    async def start(self):
+        self.queue = asyncio.Queue()
+        self.worker = asyncio.create_task(self._run())
+        return self
+
+    async def stop(self):
+        self.worker.cancel()
+        try:
+            await self.worker
+        except asyncio.CancelledError:
+            pass
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+    async def predict(self, image):
+        digest = None
+        if self.cache is not None:
+            digest = self.cache.digest(image)
+            if self.cache.refresh():
+                self.model = load_model(self.cache.model_path, self.device)
+            hit = self.cache.get(digest)
+            if hit is not None:
+                return _result(hit)
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((to_input(image), future, digest))
+        return await future
+
+    def _forward(self, images):
+        with torch.no_grad():
+            probabilities = torch.softmax(self.model(images.to(self.device)), dim=1)
+        return probabilities.cpu().numpy()
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            pending = [await self.queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(pending) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    pending.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            images = torch.stack([image for image, _, _ in pending])
+            version = self.cache.version if self.cache is not None else None
+            try:
+                # Run the model off the event loop so new requests keep queueing during the forward pass
+                probabilities = await loop.run_in_executor(None, self._forward, images)
+            except Exception as error:
+                for _, future, _ in pending:
+                    if not future.done():
+                        future.set_exception(error)
+                continue
+            self.batches += 1
+            self.requests += len(pending)
+            # A batch that straddled a checkpoint reload is answered but not cached
+            if self.cache is not None and self.cache.version == version:
+                self.cache.put_many((digest, row) for (_, _, digest), row in zip(pending, probabilities))
+            for (_, future, _), row in zip(pending, probabilities):
+                if not future.done():
+                    future.set_result(_result(row))
+
+
+async def _handle(predictor, reader, writer):
+    # Minimal HTTP/1.1: POST /predict with {"pixels": [...784 values...]} returns the prediction as JSON.
+    # Integer pixels are read as 0-255, floating-point ones as already scaled to [0, 1].
+    try:
+        request_line = await reader.readline()
+        headers = {}
+        while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get("content-length", 0))
+            if length < 0:
+                raise ValueError("negative Content-Length")
+            body = await reader.readexactly(length)
+            method, path, _ = request_line.decode("latin-1").split(" ", 2)
+        except (ValueError, asyncio.IncompleteReadError) as error:
+            status, payload = "400 Bad Request", {"error": f"malformed request: {error}"}
+        else:
+            if method != "POST" or path != "/predict":
+                status, payload = "404 Not Found", {"error": "POST /predict"}
+            else:
+                try:
+                    status, payload = "200 OK", await predictor.predict(json.loads(body)["pixels"])
+                except (KeyError, TypeError, ValueError, RuntimeError) as error:
+                    status, payload = "400 Bad Request", {"error": str(error)}
+        data = json.dumps(payload).encode()
+        writer.write(f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\nContent-Length: {len(data)}\r\n"
+                     f"Connection: close\r\n\r\n".encode() + data)
+        await writer.drain()
+    finally:
+        writer.close()
+
+
+async def serve(predictor, host="127.0.0.1", port=8000):
+    server = await asyncio.start_server(lambda r, w: _handle(predictor, r, w), host, port)
+    print(f"Serving on http://{host}:{port}/predict")
+    async with server:
+        await server.serve_forever()
+
+
+async def load_test(predictor, images, concurrency=64, requests=2000):
+    # Closed-loop load generator: `concurrency` clients each send their next request as soon as the last returns
+    latencies = []
+
+    async def client(offset):
+        for i in range(offset, requests, concurrency):
+            start = time.perf_counter()
+            await predictor.predict(images[i % len(images)])
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies = np.array(latencies) * 1000
+    return {"concurrency": concurrency, "requests": requests, "throughput": requests / elapsed,
+            "p50_ms": float(np.percentile(latencies, 50)), "p99_ms": float(np.percentile(latencies, 99))}
+
+
+async def latency_vs_throughput(model, images, concurrencies=(1, 4, 16, 64, 256), requests=2000, max_batch_size=64, max_wait=0.002, cache=None):
+    # A cache is cleared (its shared file included) before each level, so every level starts cold and
+    # its hit rate is its own
+    reports = []
+    for concurrency in concurrencies:
+        if cache is not None:
+            cache.clear()
+        async with BatchingPredictor(model, max_batch_size, max_wait, cache) as predictor:
+            report = await load_test(predictor, images, concurrency, requests)
+            report["mean_batch"] = predictor.requests / max(predictor.batches, 1)
+        line = (f"concurrency {concurrency:>4d}: {report['throughput']:>9.1f} req/s  p50 {report['p50_ms']:>7.3f} ms  "
+                f"p99 {report['p99_ms']:>7.3f} ms  mean batch {report['mean_batch']:>5.1f}")
+        if cache is not None:
+            report["cache"] = cache.stats()
+            line += f"  hit rate {100 * report['cache']['hit_rate']:>5.1f}%"
+        print(line)
+        reports.append(report)
+    return reports
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Micro-batching FashionMNIST inference service")
+    parser.add_argument("command", choices=["serve", "loadtest"])
+    parser.add_argument("--model", default="data/model.pth")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--max-batch-size", type=int, default=64)
+    parser.add_argument("--max-wait-ms", type=float, default=2.0)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--cache", type=int, default=0, help="cache up to this many predictions by image content")
+    parser.add_argument("--cache-ttl", type=float, help="seconds before a cached prediction expires")
+    parser.add_argument("--cache-file", help="SQLite file shared by all server processes")
+    args = parser.parse_args()
+
+    model = load_model(args.model)
+    cache = None
+    if args.cache:
+        from FashionMNISTCache import PredictionCache
+        cache = PredictionCache(args.cache, args.cache_ttl, args.model, args.cache_file)
+    if args.command == "serve":
+        async def main():
+            async with BatchingPredictor(model, args.max_batch_size, args.max_wait_ms / 1000, cache) as predictor:
+                await serve(predictor, args.host, args.port)
+        asyncio.run(main())
+    else:
+        from FashionMNISTData import load_raw
+        images = load_raw(root="data", train=False).data
+        asyncio.run(latency_vs_throughput(model, images, requests=args.requests,
+                                          max_batch_size=args.max_batch_size, max_wait=args.max_wait_ms / 1000, cache=cache))
@@ -0,0 +1,179 @@
+import itertools
+import math
+import multiprocessing
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import torch
+from torch import nn
+
+from FashionMNISTData import BatchIterator, load_raw
+from FashionMNISTModel import NeuralNetwork, train, test
+from FashionMNISTResults import ResultStore, trial_key
+
+
+def expand_grid(**axes):
+    # Full Cartesian product, e.g. expand_grid(layer1size=[256, 512], learning_rate=[1e-3, 1e-2])
+    names = list(axes)
+    return [dict(zip(names, values)) for values in itertools.product(*axes.values())]
+
+
+class EarlyStopping:
+    # Plateau detection: step() returns True once the metric hasn't improved by min_delta for patience epochs
+    def __init__(self, patience=10, min_delta=0.0, mode="max"):
+        self.patience, self.min_delta, self.mode = patience, min_delta, mode
+        self.best, self.best_epoch, self.epoch = None, 0, 0
+
+    def step(self, metric):
+        self.epoch += 1
+        improved = self.best is None or (metric > self.best + self.min_delta if self.mode == "max" else metric < self.best - self.min_delta)
+        if improved:
+            self.best, self.best_epoch = metric, self.epoch
+        return self.epoch - self.best_epoch >= self.patience
+
+
+def _snapshot(model, optimizer, accuracies, avg_losses, seconds):
+    return {"model": {k: v.cpu() for k, v in model.state_dict().items()}, "optimizer": optimizer.state_dict(),
+            "accuracies": list(accuracies), "avg_losses": list(avg_losses), "seconds": seconds}
+
+
+def run_trial(config, epochs, root="data", device="cpu", seed=0, state=None, return_state=False, patience=None, store=None):
+    # Trains config up to a total of `epochs`; passing a previous trial's state continues it from where it stopped.
+    # With a ResultStore path, finished trials are answered from the store and interrupted ones resume.
+    key = trial_key(config, seed, patience=patience)
+    results_store = ResultStore(store) if store is not None else None
+    try:
+        if results_store is not None:
+            cached = results_store.get(key)
+            if cached is not None and (cached["epochs"] >= epochs or cached["status"] == "stopped"):
+                accuracies, avg_losses = cached["accuracies"][:epochs], cached["avg_losses"][:epochs]
+                result = {**config, "key": key, "epochs": len(accuracies), "accuracy": accuracies[-1], "avg_loss": avg_losses[-1],
+                          "accuracies": accuracies, "avg_losses": avg_losses, "seconds": cached["seconds"],
+                          "stopped": cached["status"] == "stopped", "cached": True}
+                if return_state:
+                    result["state"] = results_store.load_state(key)
+                return result
+            stored = results_store.load_state(key)
+            if stored is not None and (state is None or len(stored["accuracies"]) > len(state["accuracies"])):
+                state = stored
+            results_store.start(key, config, seed, epochs)
+
+        torch.manual_seed(seed)
+        training_data = load_raw(root=root, train=True)
+        test_data = load_raw(root=root, train=False)
+        train_dataloader = BatchIterator(training_data, batch_size=config["batch_size"], device=device)
+        test_dataloader = BatchIterator(test_data, batch_size=config["batch_size"], device=device)
+
+        model = NeuralNetwork(config["layer1size"], config["layer2size"]).to(device)
+        loss_fn = nn.CrossEntropyLoss()
+        optimizer = torch.optim.SGD(model.parameters(), lr=config["learning_rate"])
+
+        accuracies, avg_losses, seconds = [], [], 0.0
+        if state is not None:
+            model.load_state_dict(state["model"])
+            optimizer.load_state_dict(state["optimizer"])
+            accuracies, avg_losses, seconds = list(state["accuracies"]), list(state["avg_losses"]), state["seconds"]
+        stopper = EarlyStopping(patience) if patience else None
+        stopped = False
+
+        start = time.perf_counter()
+        for t in range(len(accuracies), epochs):
+            train(train_dataloader, model, loss_fn, optimizer, verbose=False)
+            accuracy, avg_loss = test(test_dataloader, model, loss_fn, verbose=False)
+            accuracies.append(accuracy)
+            avg_losses.append(avg_loss)
+            if results_store is not None:
+                elapsed = seconds + time.perf_counter() - start
+                results_store.record_epoch(key, len(accuracies), accuracy, avg_loss, elapsed,
+                                           _snapshot(model, optimizer, accuracies, avg_losses, elapsed))
+            if stopper is not None and stopper.step(accuracy):
+                stopped = True
+                break
+        seconds += time.perf_counter() - start
+        if results_store is not None and stopped:
+            results_store.finish(key, "stopped")
+        result = {**config, "key": key, "epochs": len(accuracies), "accuracy": accuracies[-1], "avg_loss": avg_losses[-1],
+                  "accuracies": accuracies, "avg_losses": avg_losses, "seconds": seconds, "stopped": stopped, "cached": False}
+        if return_state:
+            result["state"] = _snapshot(model, optimizer, accuracies, avg_losses, seconds)
+        return result
+    finally:
+        if results_store is not None:
+            results_store.close()
+
+
+def _init_worker(threads_per_worker):
+    # Fixed per-worker thread budget so concurrent trials don't oversubscribe the cores
+    torch.set_num_threads(threads_per_worker)
+    torch.set_num_interop_threads(1)
+
+
+def worker_pool(workers=None, threads_per_worker=1):
+    if workers is None:
+        workers = max(1, (os.cpu_count() or 1) // threads_per_worker)
+    # spawn rather than fork: forking after torch has started its thread pools can deadlock
+    context = multiprocessing.get_context("spawn")
+    return ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                               initializer=_init_worker, initargs=(threads_per_worker,))
+
+
+def run_sweep(grid, epochs, workers=None, threads_per_worker=1, root="data", device="cpu", seed=0, patience=None, store=None):
+    with worker_pool(workers, threads_per_worker) as pool:
+        futures = [pool.submit(run_trial, config, epochs, root, device, seed, patience=patience, store=store) for config in grid]
+        return [future.result() for future in futures]
+
+
+def successive_halving(grid, min_epochs=1, max_epochs=27, eta=3, workers=None, threads_per_worker=1,
+                       root="data", device="cpu", seed=0, pool=None, store=None):
+    # Every config trains for min_epochs; the best 1/eta by test accuracy are promoted to eta times the
+    # budget (resuming from their saved state) and the rest are killed, until max_epochs is reached.
+    own_pool = pool is None
+    if own_pool:
+        pool = worker_pool(workers, threads_per_worker)
+    try:
+        finished, alive = [], [(config, None) for config in grid]
+        budget, rung = min_epochs, 0
+        while alive:
+            futures = [pool.submit(run_trial, config, budget, root, device, seed, state, True, store=store) for config, state in alive]
+            results = [dict(future.result(), rung=rung) for future in futures]
+            if budget >= max_epochs:
+                finished += results
+                break
+            results.sort(key=lambda row: -row["accuracy"])
+            keep = max(1, len(results) // eta)
+            finished += results[keep:]
+            alive = [({k: row[k] for k in grid[0]}, row["state"]) for row in results[:keep]]
+            budget, rung = min(budget * eta, max_epochs), rung + 1
+    finally:
+        if own_pool:
+            pool.shutdown()
+    for row in finished:
+        row.pop("state", None)
+    return finished
+
+
+def hyperband(grid, max_epochs=27, eta=3, workers=None, threads_per_worker=1, root="data", device="cpu", seed=0, store=None):
+    # Runs successive halving brackets that trade the number of configs against their starting budget;
+    # configs for each bracket are sampled from the grid.
+    s_max = int(math.log(max_epochs, eta) + 1e-9)
+    sampler = random.Random(seed)
+    results = []
+    with worker_pool(workers, threads_per_worker) as pool:
+        for s in range(s_max, -1, -1):
+            n = min(len(grid), math.ceil((s_max + 1) / (s + 1) * eta ** s))
+            min_epochs = max(1, round(max_epochs * eta ** -s))
+            bracket = successive_halving(sampler.sample(grid, n), min_epochs, max_epochs, eta,
+                                         root=root, device=device, seed=seed, pool=pool, store=store)
+            results += [dict(row, bracket=s) for row in bracket]
+    return results
+
+
+def format_table(results, columns=("layer1size", "layer2size", "learning_rate", "batch_size", "epochs", "accuracy", "avg_loss", "seconds")):
+    rows = [[f"{row[c]:.4g}" if isinstance(row[c], float) else str(row[c]) for c in columns]
+            for row in sorted(results, key=lambda row: -row["accuracy"])]
+    widths = [max([len(c)] + [len(r[i]) for r in rows]) for i, c in enumerate(columns)]
+    lines = ["  ".join(c.rjust(w) for c, w in zip(columns, widths))]
+    lines += ["  ".join(v.rjust(w) for v, w in zip(r, widths)) for r in rows]
+    return "\n".join(lines)
@@ -0,0 +1,137 @@
+import argparse
+import hashlib
+import json
+import math
+import multiprocessing
+import os
+import platform
+import resource
+import time
+
+import torch
+from torch import nn
+
+from FashionMNISTData import BatchIterator, TensorDataset, load_raw
+from FashionMNISTModel import NeuralNetwork, train, test
+
+
+def host_fingerprint():
+    # Hardware and torch build, not the hostname, so identical nodes share one cached result
+    cpu = platform.processor()
+    try:
+        with open("/proc/cpuinfo") as f:
+            cpu = next((line.split(":", 1)[1].strip() for line in f if line.startswith("model name")), cpu)
+    except OSError:
+        pass
+    memory = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") if hasattr(os, "sysconf") else 0
+    payload = json.dumps([platform.machine(), cpu, os.cpu_count(), memory // 2**30, torch.__version__,
+                          torch.backends.mkldnn.is_available(), torch.cuda.is_available()])
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+def scale_learning_rate(learning_rate, batch_size, base_batch_size=64, rule="linear"):
+    ratio = batch_size / base_batch_size
+    if rule == "linear":
+        return learning_rate * ratio
+    if rule == "sqrt":
+        return learning_rate * math.sqrt(ratio)
+    if rule is None or rule == "none":
+        return learning_rate
+    raise ValueError(f"unknown learning rate scaling rule {rule!r}")
+
+
+def _measure(threads, interop, batch_sizes, steps, root, layer1size, layer2size):
+    # Runs in a fresh process: the inter-op pool can only be sized before torch does any parallel work
+    torch.set_num_threads(threads)
+    torch.set_num_interop_threads(interop)
+    training_data = load_raw(root=root, train=True)
+    test_data = load_raw(root=root, train=False)
+    loss_fn = nn.CrossEntropyLoss()
+    rows = []
+    # Ascending batch sizes, so peak RSS after each one is that batch size's peak
+    for batch_size in sorted(batch_sizes):
+        count = min(len(training_data), batch_size * (steps + 2))
+        model = NeuralNetwork(layer1size, layer2size)
+        optimizer = torch.optim.SGD(model.parameters(), lr=1e-3)
+        warmup = BatchIterator(TensorDataset(training_data.data[:2 * batch_size], training_data.targets[:2 * batch_size]), batch_size)
+        burst = BatchIterator(TensorDataset(training_data.data[:count], training_data.targets[:count]), batch_size)
+        test_count = min(len(test_data), batch_size * steps)
+        test_burst = BatchIterator(TensorDataset(test_data.data[:test_count], test_data.targets[:test_count]), batch_size)
+
+        train(warmup, model, loss_fn, optimizer, verbose=False)
+        start = time.perf_counter()
+        train(burst, model, loss_fn, optimizer, verbose=False)
+        train_rate = count / (time.perf_counter() - start)
+        start = time.perf_counter()
+        test(test_burst, model, loss_fn, verbose=False)
+        test_rate = test_count / (time.perf_counter() - start)
+        rows.append({"threads": threads, "interop_threads": interop, "batch_size": batch_size,
+                     "train_samples_per_s": train_rate, "test_samples_per_s": test_rate,
+                     "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024})
+    return rows
+
+
+def tune(batch_sizes=(32, 64, 128, 256, 512, 1024), thread_counts=None, interop_counts=(1, 2), steps=20,
+         memory_limit_mb=None, root="data", layer1size=512, layer2size=512):
+    if thread_counts is None:
+        cores = os.cpu_count() or 1
+        thread_counts = sorted({1, max(1, cores // 4), max(1, cores // 2), cores})
+    context = multiprocessing.get_context("spawn")
+    rows = []
+    with context.Pool(1, maxtasksperchild=1) as pool:
+        for threads in thread_counts:
+            for interop in interop_counts:
+                rows += pool.apply(_measure, (threads, interop, batch_sizes, steps, root, layer1size, layer2size))
+    eligible = [row for row in rows if memory_limit_mb is None or row["peak_rss_mb"] <= memory_limit_mb]
+    if not eligible:
+        raise RuntimeError(f"no configuration fits in {memory_limit_mb} MB")
+    best = max(eligible, key=lambda row: row["train_samples_per_s"])
+    return best, rows
+
+
+def _cache_key(layer1size, layer2size, batch_sizes, memory_limit_mb):
+    return f"{host_fingerprint()}:{layer1size}x{layer2size}:{','.join(map(str, sorted(batch_sizes)))}:{memory_limit_mb}"
+
+
+def tuned_settings(base_batch_size=64, base_learning_rate=1e-3, rule="linear", cache="data/tuning.json",
+                   batch_sizes=(32, 64, 128, 256, 512, 1024), memory_limit_mb=None, root="data",
+                   layer1size=512, layer2size=512, retune=False):
+    # Fastest batch size / thread settings for this host, measured once and cached per host fingerprint;
+    # the learning rate is rescaled from the base settings by `rule` (linear or sqrt)
+    key = _cache_key(layer1size, layer2size, batch_sizes, memory_limit_mb)
+    results = {}
+    if os.path.exists(cache):
+        with open(cache) as f:
+            results = json.load(f)
+    if retune or key not in results:
+        best, rows = tune(batch_sizes, memory_limit_mb=memory_limit_mb, root=root, layer1size=layer1size, layer2size=layer2size)
+        results[key] = {"best": best, "measurements": rows, "tuned_at": time.time()}
+        os.makedirs(os.path.dirname(cache) or ".", exist_ok=True)
+        with open(cache + ".tmp", "w") as f:
+            json.dump(results, f, indent=1)
+        os.replace(cache + ".tmp", cache)
+    best = results[key]["best"]
+    return {"batch_size": best["batch_size"], "threads": best["threads"], "interop_threads": best["interop_threads"],
+            "learning_rate": scale_learning_rate(base_learning_rate, best["batch_size"], base_batch_size, rule)}
+
+
+def apply_settings(settings):
+    torch.set_num_threads(settings["threads"])
+    try:
+        torch.set_num_interop_threads(settings["interop_threads"])
+    except RuntimeError:
+        # Too late once torch has started inter-op work in this process; the intra-op setting still applies
+        pass
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Find the throughput-optimal batch size and thread counts for this host")
+    parser.add_argument("--root", default="data")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[32, 64, 128, 256, 512, 1024])
+    parser.add_argument("--memory-limit-mb", type=float)
+    parser.add_argument("--rule", choices=["linear", "sqrt", "none"], default="linear")
+    parser.add_argument("--retune", action="store_true")
+    args = parser.parse_args()
+    settings = tuned_settings(rule=args.rule, batch_sizes=args.batch_sizes, memory_limit_mb=args.memory_limit_mb,
+                              root=args.root, retune=args.retune)
+    print(json.dumps(settings, indent=1))